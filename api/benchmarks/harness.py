@@ -0,0 +1,128 @@
+import json
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+
+@dataclass
+class EndpointResult:
+    name: str
+    method: str
+    path: str
+    status: int
+    iterations: int
+    queries: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    statuses: list = field(default_factory=list)
+
+
+@contextmanager
+def benchmark_environment():
+    """Settings for a deterministic run.
+
+    Background tasks run inline after commit, so their writes never race the
+    measured requests and their failures surface as 500s. Throttles are
+    lifted, and files go to a temporary media root.
+    """
+    rates = {scope: '1000000/s' for scope in settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {})}
+    with tempfile.TemporaryDirectory() as media_root, override_settings(
+        BACKGROUND_TASKS_EAGER=True,
+        MEDIA_ROOT=media_root,
+        BOOK_UPLOAD_DIR=os.path.join(media_root, 'uploads'),
+        REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates},
+    ):
+        yield
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Benchmark:
+    """Times one request repeatedly and records its SQL query count.
+
+    Usable directly from a pytest test in the style of pytest-benchmark:
+    ``result = Benchmark(client).run('books.list', 'get', '/api/books/')``.
+    """
+
+    def __init__(self, client, iterations=20, warmup=1, cold_cache=True, cache_alias='responses'):
+        self.client = client
+        self.iterations = iterations
+        self.warmup = warmup
+        self.cold_cache = cold_cache
+        self.cache_alias = cache_alias
+
+    def _request(self, method, path, data, headers):
+        if self.cold_cache:
+            caches[self.cache_alias].clear()
+        return getattr(self.client, method)(path, data=data, format='json', headers=headers or {})
+
+    def run(self, name, method, path, data=None, headers=None):
+        """Time `iterations` requests; `statuses` lists every status seen, not just the last one."""
+        for _ in range(self.warmup):
+            self._request(method, path, data, headers)
+
+        timings, queries, statuses = [], 0, []
+        for _ in range(self.iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = self._request(method, path, data, headers)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, len(captured))
+            statuses.append(response.status_code)
+
+        return EndpointResult(
+            name=name, method=method.upper(), path=path, status=statuses[0], statuses=sorted(set(statuses)),
+            iterations=self.iterations,
+            queries=queries, p50_ms=round(percentile(timings, 0.50), 3), p95_ms=round(percentile(timings, 0.95), 3),
+            p99_ms=round(percentile(timings, 0.99), 3), mean_ms=round(statistics.fmean(timings), 3),
+        )
+
+
+def server_errors(results):
+    return [f'{result.name}: {result.statuses}' for result in results
+            if any(status >= 500 for status in result.statuses)]
+
+
+def write_report(path, results, meta):
+    report = {'meta': meta, 'endpoints': {result.name: asdict(result) for result in results}}
+    with open(path, 'w') as handle:
+        json.dump(report, handle, indent=2, sort_keys=True)
+    return report
+
+
+def compare(report, baseline, latency_tolerance=0.25):
+    """Return human readable regressions of `report` against `baseline`.
+
+    Any increase in query count is a regression (that is how N+1 shows up);
+    latency only counts when p95 grows by more than `latency_tolerance`.
+    """
+    regressions = []
+    for name, previous in baseline.get('endpoints', {}).items():
+        current = report['endpoints'].get(name)
+        if current is None:
+            regressions.append(f'{name}: missing from this run')
+            continue
+        # Reports written before `statuses` existed only carry the last status.
+        before = previous.get('statuses', [previous['status']])
+        after = current.get('statuses', [current['status']])
+        if after != before:
+            regressions.append(f'{name}: status {before} -> {after}')
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: queries {previous['queries']} -> {current['queries']}")
+        if current['p95_ms'] > previous['p95_ms'] * (1 + latency_tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+    return regressions
@@ -0,0 +1,86 @@
+import json
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.benchmarks.harness import Benchmark, benchmark_environment, compare, server_errors, write_report
+from api.benchmarks.scenarios import build_scenarios
+from api.benchmarks.seed import SCALES, seed
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database, drive the API through the test client and report latency '
+            'percentiles and SQL query counts per endpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+        for volume in SCALES['small']:
+            parser.add_argument(f"--{volume.replace('_', '-')}", type=int, dest=volume)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Keep the response cache between iterations instead of measuring cold builds')
+        parser.add_argument('--only', help='Comma separated scenario names to run')
+        parser.add_argument('--output', default='benchmark-report.json')
+        parser.add_argument('--baseline', help='Previous report to diff against; regressions fail the command')
+        parser.add_argument('--latency-tolerance', type=float, default=0.25)
+
+    def handle(self, *args, **options):
+        volumes = dict(SCALES[options['scale']])
+        volumes.update({key: options[key] for key in volumes if options.get(key) is not None})
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with benchmark_environment():
+                data = seed(**volumes)
+                self.stdout.write(f"Seeded {data.counts} in {data.seconds:.1f}s")
+                results = self.run_scenarios(data, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = write_report(options['output'], results, {
+            'scale': options['scale'], 'volumes': volumes, 'counts': data.counts,
+            'iterations': options['iterations'], 'warm_cache': options['warm_cache'],
+            'vendor': connection.vendor, 'django': django.get_version(), 'created_at': timezone.now().isoformat(),
+        })
+        self.print_table(results)
+        self.stdout.write(f"Report written to {options['output']}")
+
+        errors = server_errors(results)
+        if errors:
+            raise CommandError('Endpoints answered with server errors:\n  ' + '\n  '.join(errors))
+
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)
+            if options['only']:
+                baseline['endpoints'] = {name: value for name, value in baseline['endpoints'].items()
+                                         if name in report['endpoints']}
+            regressions = compare(report, baseline, options['latency_tolerance'])
+            if regressions:
+                raise CommandError('Benchmark regressions:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
+
+    def run_scenarios(self, data, options):
+        only = set(options['only'].split(',')) if options['only'] else None
+        # A failing endpoint is reported with its statuses and fails the run once the report is written.
+        client = APIClient(raise_request_exception=False)
+        benchmark = Benchmark(client, iterations=options['iterations'], cold_cache=not options['warm_cache'])
+        results = []
+        for name, method, path, payload, headers in build_scenarios(data):
+            if only and name not in only:
+                continue
+            results.append(benchmark.run(name, method, path, payload, headers))
+        return results
+
+    def print_table(self, results):
+        self.stdout.write(f"{'endpoint':<28}{'status':>9}{'queries':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for result in results:
+            statuses = ','.join(map(str, result.statuses))
+            self.stdout.write(f'{result.name:<28}{statuses:>9}{result.queries:>9}'
+                              f'{result.p50_ms:>10.2f}{result.p95_ms:>10.2f}{result.p99_ms:>10.2f}')
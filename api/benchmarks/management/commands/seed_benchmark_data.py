@@ -0,0 +1,34 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.benchmarks.seed import BENCHMARK_PASSWORD, SCALES, seed
+
+
+def is_test_database(connection):
+    name = str(connection.settings_dict['NAME'])
+    return name == connection.creation._get_test_db_name() or os.path.basename(name).startswith('test_')
+
+
+class Command(BaseCommand):
+    help = 'Seed a test database (one named test_*) with a reproducible benchmark dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+        for volume in SCALES['small']:
+            parser.add_argument(f"--{volume.replace('_', '-')}", type=int, dest=volume)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # The dataset holds verified accounts sharing a published password.
+        if not is_test_database(connection):
+            raise CommandError(
+                f"Refusing to seed {connection.settings_dict['NAME']}: benchmark users log in with "
+                f"'{BENCHMARK_PASSWORD}'. Point DATABASE_NAME at a database named test_*."
+            )
+        volumes = dict(SCALES[options['scale']])
+        volumes.update({key: options[key] for key in volumes if options.get(key) is not None})
+        data = seed(seed_value=options['seed'], **volumes)
+        summary = ', '.join(f'{count} {name}' for name, count in data.counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Seeded {summary} in {data.seconds:.1f}s'))
@@ -0,0 +1,90 @@
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.books.models import BookUpload
+from api.books.similarity import refresh_book
+from api.books.uploads import part_path
+from .seed import BENCHMARK_PASSWORD
+
+# Routes that send email or delete the account (register, verify/*,
+# reset-password, profile delete) and admin are left out: they either
+# mutate the dataset between iterations or measure something other than
+# the API. Run them inside benchmark_environment() so files land in a
+# temporary media root.
+
+BULK_RATINGS = 20
+RELATIONSHIP_LOOKUP = 50
+BOOK_BYTES = b'%PDF-1.4\n' + b'0' * (256 * 1024)
+
+
+def bearer(user):
+    return {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+
+def prepare_files(book, reader):
+    """Write the book file the download scenario streams and an upload session it can inspect."""
+    path = default_storage.path(book.book.name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as handle:
+        handle.write(BOOK_BYTES)
+    upload = BookUpload.objects.create(user=reader, filename='book.pdf', size=len(BOOK_BYTES),
+                                       checksum=hashlib.sha256(BOOK_BYTES).hexdigest())
+    with open(part_path(upload), 'wb') as handle:
+        handle.write(BOOK_BYTES[:len(BOOK_BYTES) // 2])
+    return upload
+
+
+def build_scenarios(data):
+    book = next(book for book in data.books if not book.is_private)
+    owner = next(user for user in data.users if user.pk == book.user_id)
+    reader = next(user for user in data.users if user.pk != owner.pk)
+    root = next((comment for comment in data.comments if comment.book_id == book.pk), None)
+    refresh = RefreshToken.for_user(reader)
+    as_reader, as_owner = bearer(reader), bearer(owner)
+    upload = prepare_files(book, reader)
+    refresh_book(book.pk)
+    others = [other for other in data.books if other.user_id != reader.pk][:BULK_RATINGS]
+    rated = [{'book': str(other.pk), 'rating': index % 5 + 1} for index, other in enumerate(others)]
+    looked_up = [str(user.pk) for user in data.users[:RELATIONSHIP_LOOKUP]]
+
+    scenarios = [
+        ('books.list', 'get', '/api/books/', None, as_reader),
+        ('books.list.views', 'get', '/api/books/?sort_by=views', None, as_reader),
+        ('books.list.rating', 'get', '/api/books/?sort_by=rating', None, as_reader),
+        ('books.list.top', 'get', '/api/books/?sort_by=top', None, as_reader),
+        ('books.list.trending', 'get', '/api/books/?sort_by=trending', None, as_reader),
+        ('books.search', 'get', '/api/books/?search=river%20garden', None, as_reader),
+        ('books.retrieve', 'get', f'/api/books/{book.pk}/', None, as_reader),
+        ('books.similar', 'get', f'/api/books/{book.pk}/similar/', None, as_reader),
+        ('books.download', 'get', f'/api/books/{book.pk}/download/', None, as_reader),
+        ('books.download.range', 'get', f'/api/books/{book.pk}/download/', None,
+         {**as_reader, 'Range': 'bytes=0-65535'}),
+        ('books.comments', 'get', f'/api/books/{book.pk}/comments/', None, as_reader),
+        ('books.my_books', 'get', '/api/books/my-books/', None, as_owner),
+        ('books.review', 'post', f'/api/books/{book.pk}/review/', {'rating': 4}, as_reader),
+        ('books.ratings_bulk', 'post', '/api/books/ratings/bulk/', {'ratings': rated}, as_reader),
+        ('books.uploads.create', 'post', '/api/books/uploads/',
+         {'filename': 'book.pdf', 'size': upload.size, 'checksum': upload.checksum}, as_reader),
+        ('books.uploads.retrieve', 'get', f'/api/books/uploads/{upload.pk}/', None, as_reader),
+        ('users.token', 'post', '/api/users/token/', {'email': reader.email, 'password': BENCHMARK_PASSWORD}, None),
+        ('users.token_refresh', 'post', '/api/users/token/refresh/', {'refresh': str(refresh)}, None),
+        ('users.token_verify', 'post', '/api/users/token/verify/', {'token': str(refresh.access_token)}, None),
+        ('users.profile', 'get', '/api/users/profile/', None, as_reader),
+        ('users.public_profile', 'get', f'/api/users/{owner.email}/', None, as_reader),
+        ('users.books', 'get', f'/api/users/{owner.email}/books/', None, as_reader),
+        ('networks.friend_requests', 'get', '/api/networks/friend-requests/', None, as_reader),
+        ('networks.my_requests', 'get', '/api/networks/my-requests/', None, as_reader),
+        ('networks.get_friends', 'get', '/api/networks/get-friends/', None, as_reader),
+        ('networks.feed', 'get', '/api/networks/feed/', None, as_reader),
+        ('networks.suggestions', 'get', '/api/networks/suggestions/', None, as_reader),
+        ('networks.relationships', 'post', '/api/networks/relationships/', {'ids': looked_up}, as_reader),
+        ('swagger', 'get', '/api/swagger/?format=openapi', None, None),
+    ]
+    if root is not None:
+        scenarios.append(
+            ('books.replies', 'get', f'/api/books/{book.pk}/comments/{root.pk}/replies/', None, as_reader)
+        )
+    return scenarios
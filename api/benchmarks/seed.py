@@ -0,0 +1,141 @@
+import random
+import time
+from dataclasses import dataclass, field
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from api.books.models import Book, Comment, Rating
+from api.books.rankings import rebuild_rankings
+from api.books.ratings import rebuild_rating_aggregates
+from api.books.search import get_search_backend
+from api.chatapp.models import Message
+from api.networks.models import FeedEntry, Friend, FriendRequest
+from api.users.models import User
+
+BENCHMARK_PASSWORD = 'Benchmark1'
+BATCH_SIZE = 1000
+
+SCALES = {
+    'small': dict(users=50, books_per_user=4, ratings_per_book=5, comments_per_book=4,
+                  replies_per_comment=3, friends_per_user=5, messages_per_user=5),
+    'medium': dict(users=500, books_per_user=6, ratings_per_book=20, comments_per_book=10,
+                   replies_per_comment=5, friends_per_user=20, messages_per_user=20),
+    'large': dict(users=5000, books_per_user=8, ratings_per_book=50, comments_per_book=20,
+                  replies_per_comment=8, friends_per_user=50, messages_per_user=40),
+}
+
+WORDS = ('river', 'garden', 'shadow', 'python', 'winter', 'empire', 'silent', 'glass', 'ocean', 'letters',
+         'history', 'machine', 'forest', 'stone', 'kingdom', 'light', 'journey', 'memory', 'night', 'city')
+
+
+@dataclass
+class SeededData:
+    users: list = field(default_factory=list)
+    books: list = field(default_factory=list)
+    comments: list = field(default_factory=list)
+    counts: dict = field(default_factory=dict)
+    seconds: float = 0.0
+
+
+def _phrase(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _bulk(model, objects):
+    model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+    return objects
+
+
+@transaction.atomic
+def seed(users, books_per_user, ratings_per_book, comments_per_book, replies_per_comment,
+         friends_per_user, messages_per_user, seed_value=42):
+    """Insert a reproducible dataset of the given volumes and return handles to it."""
+    rng = random.Random(seed_value)
+    started = time.perf_counter()
+    data = SeededData()
+    password = make_password(BENCHMARK_PASSWORD)
+
+    data.users = _bulk(User, [
+        User(email=f'bench{i}@example.com', name=f'Reader {i}', password=password, verified=True)
+        for i in range(users)
+    ])
+
+    data.books = _bulk(Book, [
+        Book(user=owner, title=_phrase(rng, 3), book_author=_phrase(rng, 2)[:60], description=_phrase(rng, 30),
+             cover=f'medias/book/covers/bench-{owner.pk.hex[:8]}-{n}.jpg',
+             book=f'medias/book/books/bench-{owner.pk.hex[:8]}-{n}.pdf',
+             cover_variants={'source': f'medias/book/covers/bench-{owner.pk.hex[:8]}-{n}.jpg'},
+             is_private=rng.random() < 0.1, view_count=rng.randint(0, 5000))
+        for owner in data.users for n in range(books_per_user)
+    ])
+    search = get_search_backend()
+    for start in range(0, len(data.books), BATCH_SIZE):
+        search.index_books(data.books[start:start + BATCH_SIZE])
+
+    ratings = []
+    for book in data.books:
+        for rater in rng.sample(data.users, min(ratings_per_book, len(data.users))):
+            if rater.pk != book.user_id:
+                ratings.append(Rating(book=book, user=rater, rating=rng.randint(1, 5)))
+    _bulk(Rating, ratings)
+    rebuild_rating_aggregates()
+    rebuild_rankings()
+
+    roots, replies = [], []
+    for book in data.books:
+        for _ in range(comments_per_book):
+            root = Comment(book=book, user=rng.choice(data.users), content=_phrase(rng, 12))
+            roots.append(root)
+            previous = root
+            for _ in range(replies_per_comment):
+                reply = Comment(book=book, user=rng.choice(data.users), content=_phrase(rng, 8),
+                                parent=root, child=previous)
+                replies.append(reply)
+                previous = reply
+    _bulk(Comment, roots)
+    _bulk(Comment, replies)
+    data.comments = roots
+
+    # Offsets stay below half the ring so no (from, to) pair is generated twice.
+    friends_per_user = min(friends_per_user, (len(data.users) - 1) // 2)
+    friends, requests = [], []
+    for index, user in enumerate(data.users):
+        for offset in range(1, friends_per_user + 1):
+            other = data.users[(index + offset) % len(data.users)]
+            if other.pk == user.pk:
+                continue
+            if offset % 2:
+                friends.append(Friend(user=user, friend_user=other))
+                requests.append(FriendRequest(from_user=other, to_user=user, accepted=True))
+            else:
+                requests.append(FriendRequest(from_user=user, to_user=other))
+    _bulk(Friend, friends)
+    _bulk(FriendRequest, requests)
+
+    # Timelines as fan-out would have left them: every friend sees the other's public uploads.
+    public_books = {}
+    for book in data.books:
+        if not book.is_private:
+            public_books.setdefault(book.user_id, []).append(book)
+    entries = [
+        FeedEntry(owner_id=reader, actor_id=actor, verb=FeedEntry.BOOK, book=book)
+        for friend in friends
+        for reader, actor in ((friend.user_id, friend.friend_user_id), (friend.friend_user_id, friend.user_id))
+        for book in public_books.get(actor, [])
+    ]
+    _bulk(FeedEntry, entries)
+
+    messages = [
+        Message(sender=user, receiver=rng.choice(data.users), message=_phrase(rng, 10))
+        for user in data.users for _ in range(messages_per_user)
+    ]
+    _bulk(Message, messages)
+
+    data.counts = {
+        'users': len(data.users), 'books': len(data.books), 'ratings': len(ratings),
+        'comments': len(roots) + len(replies), 'friends': len(friends),
+        'friend_requests': len(requests), 'feed_entries': len(entries), 'messages': len(messages),
+    }
+    data.seconds = time.perf_counter() - started
+    return data
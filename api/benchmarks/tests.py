@@ -0,0 +1,45 @@
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.benchmarks.harness import Benchmark, benchmark_environment, compare, server_errors
+from api.benchmarks.scenarios import build_scenarios
+from api.benchmarks.seed import seed
+from api.books.counters import view_counter
+
+TINY = dict(users=4, books_per_user=2, ratings_per_book=2, comments_per_book=1, replies_per_comment=1,
+            friends_per_user=1, messages_per_user=1)
+
+
+class HarnessTests(TestCase):
+    def tearDown(self):
+        # Write buffered views while the test database still exists.
+        view_counter.flush()
+
+    def test_every_scenario_answers_without_server_errors(self):
+        with benchmark_environment():
+            data = seed(**TINY)
+            benchmark = Benchmark(APIClient(raise_request_exception=False), iterations=1, warmup=0)
+            results = [benchmark.run(*scenario) for scenario in build_scenarios(data)]
+
+        self.assertEqual(server_errors(results), [])
+        names = {result.name for result in results}
+        for name in ('networks.feed', 'books.similar', 'books.ratings_bulk', 'books.download', 'books.uploads.create'):
+            self.assertIn(name, names)
+
+    def test_compare_flags_any_status_change(self):
+        endpoint = dict(status=200, statuses=[200], queries=3, p95_ms=1.0)
+        baseline = {'endpoints': {'books.list': endpoint}}
+        mixed = {'endpoints': {'books.list': {**endpoint, 'statuses': [200, 500]}}}
+        self.assertEqual(compare(mixed, baseline), ['books.list: status [200] -> [200, 500]'])
+        # Older reports only carry the last status.
+        legacy = {'endpoints': {'books.list': {key: endpoint[key] for key in ('status', 'queries', 'p95_ms')}}}
+        self.assertEqual(compare({'endpoints': {'books.list': endpoint}}, legacy), [])
+
+    def test_seeding_refuses_a_non_test_database(self):
+        with mock.patch.dict(connection.settings_dict, {'NAME': '/srv/app/db.sqlite3'}), \
+                self.assertRaisesMessage(CommandError, 'Refusing to seed'):
+            call_command('seed_benchmark_data', users=1)
@@ -0,0 +1,105 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+CATALOGUE = 'catalogue'
+
+
+def _normalize(book_id):
+    # URL kwargs may spell the same UUID differently from model instances.
+    try:
+        return uuid.UUID(str(book_id))
+    except ValueError:
+        return book_id
+
+
+def book_scope(book_id):
+    return f'book:{_normalize(book_id)}'
+
+
+def comments_scope(book_id):
+    return f'comments:{_normalize(book_id)}'
+
+
+class ResponseCache:
+    """Serialized response cache invalidated by version stamps rather than TTLs.
+
+    Every cached entry is keyed by the current version of the scopes it was
+    built from; a write bumps those versions so old entries are never read
+    again and age out of the backend's LRU. The backend is any Django cache
+    alias: LocMemCache gives a per-worker LRU, FileBasedCache a store shared
+    by all workers on the host. The stamps live in `version_alias`, which
+    must be shared by every process that writes books (web workers and
+    management commands alike), or their bumps go unseen.
+    """
+
+    def __init__(self, alias, version_alias=None):
+        self.alias = alias
+        self.version_alias = version_alias or alias
+        self._stats = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    @property
+    def versions(self):
+        return caches[self.version_alias]
+
+    def version(self, scope):
+        # Reads never write: a scope nobody has bumped is at version 0, so
+        # requests for arbitrary ids cannot fill the shared stamp store. Only
+        # bumps add stamps, and the store must be sized to keep them all, as
+        # a culled stamp falls back to 0.
+        return self.versions.get(f'version:{scope}', 0)
+
+    def bump(self, *scopes):
+        # A fresh timestamp rather than incr: shared backends such as
+        # FileBasedCache increment with a racy get/set, and two concurrent
+        # bumps landing on the same value could resurrect a stale entry.
+        for scope in scopes:
+            self.versions.set(f'version:{scope}', time.time_ns(), None)
+
+    def bump_on_commit(self, *scopes):
+        transaction.on_commit(lambda: self.bump(*scopes))
+
+    def key(self, request, name, scopes):
+        versions = ':'.join(f'{scope}={self.version(scope)}' for scope in scopes)
+        query = '&'.join(f'{k}={v}' for k, v in sorted(request.query_params.items()))
+        raw = f'{request.build_absolute_uri("/")}|{name}|{versions}|{query}'
+        return 'response:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def respond(self, request, name, scopes, build, timeout=None):
+        key = self.key(request, name, scopes)
+        data = self.backend.get(key)
+        if data is not None:
+            self._count(name, 'hit')
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        self._count(name, 'miss')
+        response = build()
+        if response.status_code == 200:
+            self.backend.set(key, response.data, timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def _count(self, name, outcome):
+        with self._lock:
+            self._stats[(name, outcome)] += 1
+
+    def stats(self):
+        with self._lock:
+            return {f'{name}.{outcome}': count for (name, outcome), count in self._stats.items()}
+
+
+_config = getattr(settings, 'RESPONSE_CACHE', {})
+response_cache = ResponseCache(_config.get('ALIAS', 'default'), _config.get('VERSION_ALIAS'))
+LIST_TIMEOUT = _config.get('LIST_TIMEOUT', 30)
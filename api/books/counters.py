@@ -0,0 +1,97 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Book
+from .rankings import record_views
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """Write-behind buffer for Book.view_count.
+
+    Hits are collected per process and written with a single UPDATE once
+    `flush_every` hits are pending or every `flush_interval` seconds, and on
+    interpreter exit. A hard kill therefore loses at most one buffer.
+    `pending` only reports hits not yet taken by a flush: while a batch is
+    being written a read may briefly miss it, but it never counts it twice.
+    """
+
+    def __init__(self, flush_every=100, flush_interval=5.0):
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._pending = Counter()
+        self._hits = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def hit(self, book_id):
+        with self._lock:
+            self._pending[book_id] += 1
+            self._hits += 1
+            due = self._hits >= self.flush_every
+        self._ensure_thread()
+        if due:
+            self.flush()
+
+    def pending(self, book_id):
+        with self._lock:
+            return self._pending.get(book_id, 0)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, Counter()
+                self._hits = 0
+            if not batch:
+                return 0
+
+            by_delta = defaultdict(list)
+            for book_id, delta in batch.items():
+                by_delta[delta].append(book_id)
+            increment = Case(
+                *[When(pk__in=ids, then=Value(delta)) for delta, ids in by_delta.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            try:
+                with transaction.atomic():
+                    Book.objects.filter(pk__in=list(batch)).update(view_count=F('view_count') + increment)
+                    record_views(batch)
+            except DatabaseError:
+                logger.exception('Failed to flush %d buffered book views', sum(batch.values()))
+                with self._lock:
+                    self._pending.update(batch)
+                return 0
+            return len(batch)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='book-view-counter', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            close_old_connections()
+            self.flush()
+
+
+_config = getattr(settings, 'BOOK_VIEW_COUNTER', {})
+view_counter = ViewCounter(
+    flush_every=_config.get('FLUSH_EVERY', 100),
+    flush_interval=_config.get('FLUSH_INTERVAL', 5.0),
+)
+atexit.register(view_counter.flush)
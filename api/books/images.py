@@ -0,0 +1,120 @@
+import logging
+import threading
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models.functions import Now
+from PIL import Image, ImageOps
+
+from .cache import CATALOGUE, book_scope, response_cache
+from .models import Book
+from .tasks import run_in_background
+
+COVER_VARIANTS = {
+    'thumb': (160, 240),
+    'medium': (320, 480),
+}
+VARIANTS_DIR = 'medias/book/covers/variants'
+
+logger = logging.getLogger(__name__)
+
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+
+
+def cover_formats():
+    Image.init()
+    return [fmt for fmt in ('webp', 'avif') if fmt.upper() in Image.SAVE]
+
+
+def variant_path(book_id, name, fmt):
+    return f'{VARIANTS_DIR}/{book_id}/{name}.{fmt}'
+
+
+def open_cover(book):
+    """Return the decoded cover, or None when it is missing or cannot be decoded."""
+    try:
+        with book.cover.open('rb') as source:
+            image = ImageOps.exif_transpose(Image.open(source))
+            image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning('Cannot derive variants from cover %s of book %s: %s', book.cover.name, book.pk, exc)
+        return None
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    return image
+
+
+def generate_cover_variants(book_id):
+    try:
+        book = Book.objects.only('id', 'cover', 'cover_variants', 'updated_at').get(pk=book_id)
+    except Book.DoesNotExist:
+        return None
+    if not book.cover:
+        return None
+
+    variants = {'source': book.cover.name}
+    image = open_cover(book)
+    if image is not None:
+        for name, size in COVER_VARIANTS.items():
+            resized = ImageOps.contain(image, size, Image.Resampling.LANCZOS)
+            variants[name] = {}
+            for fmt in cover_formats():
+                buffer = BytesIO()
+                resized.save(buffer, format=fmt.upper(), quality=80)
+                path = variant_path(book.pk, name, fmt)
+                variants[name][fmt] = default_storage.save(path, ContentFile(buffer.getvalue()))
+
+    # An undecodable cover is recorded with no variants, so reads stop
+    # re-queueing it. Only the writer that saw the current row records its
+    # result; a concurrent edit or run keeps its own and this one is dropped.
+    recorded = Book.objects.filter(pk=book.pk, updated_at=book.updated_at) \
+        .update(cover_variants=variants, updated_at=Now())
+    # Old variants are released only once the new ones are in place, so a
+    # read never points at files already gone.
+    delete_cover_variants(book.cover_variants if recorded else variants)
+    if not recorded:
+        return None
+    response_cache.bump(book_scope(book.pk), CATALOGUE)
+    return variants if image is not None else None
+
+
+def delete_cover_variants(variants):
+    for name in COVER_VARIANTS:
+        for path in (variants or {}).get(name, {}).values():
+            default_storage.delete(path)
+
+
+def schedule_cover_variants(book_id):
+    with _scheduled_lock:
+        if book_id in _scheduled:
+            return
+        _scheduled.add(book_id)
+    run_in_background(_generate_scheduled, book_id)
+
+
+def _generate_scheduled(book_id):
+    try:
+        generate_cover_variants(book_id)
+    finally:
+        with _scheduled_lock:
+            _scheduled.discard(book_id)
+
+
+def cover_variant_urls(book, request=None):
+    """Return {variant: {format: url}} or {} and queue generation when the variants are stale."""
+    variants = book.cover_variants or {}
+    if not book.cover:
+        return {}
+    if variants.get('source') != book.cover.name:
+        schedule_cover_variants(book.pk)
+        return {}
+
+    urls = {}
+    for name in COVER_VARIANTS:
+        urls[name] = {}
+        for fmt, path in variants.get(name, {}).items():
+            url = default_storage.url(path)
+            urls[name][fmt] = request.build_absolute_uri(url) if request is not None else url
+    return urls
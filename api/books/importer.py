@@ -0,0 +1,203 @@
+import csv
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from django.core.files import File
+from django.db import transaction
+
+from .cache import CATALOGUE, response_cache
+from .models import Book
+from .rankings import ensure_rankings
+from .search import get_search_backend
+from .storage import is_blob
+
+# Stable ids make a re-run after a crash between commit and checkpoint a no-op.
+IMPORT_NAMESPACE = uuid.UUID('8f1d4c1e-4a55-4b43-9d67-2f0f5b8a9c31')
+
+
+class ManifestError(Exception):
+    pass
+
+
+def read_manifest(path):
+    """Yield (row number, row dict) from a CSV or JSONL manifest without loading it."""
+    with open(path, newline='', encoding='utf-8') as handle:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for number, line in enumerate(handle, 1):
+                if line.strip():
+                    yield number, json.loads(line)
+        else:
+            for number, row in enumerate(csv.DictReader(handle), 1):
+                yield number, row
+
+
+def write_checkpoint(path, state):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as handle:
+        json.dump(state, handle)
+    os.replace(tmp, path)
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    imported: int = 0
+    skipped: int = 0
+    bytes: int = 0
+    started: float = field(default_factory=time.monotonic)
+    errors: list = field(default_factory=list)
+
+    @property
+    def seconds(self):
+        return time.monotonic() - self.started
+
+    def rate(self):
+        seconds = max(self.seconds, 1e-9)
+        return self.rows / seconds, self.bytes / seconds / (1024 * 1024)
+
+
+class BookImporter:
+    """Stream manifest rows into Book batches: copy files in parallel, then one bulk INSERT per batch."""
+
+    max_errors = 1000
+
+    def __init__(self, files_dir, owners, batch_size=500, workers=8, dry_run=False, private=False):
+        self.files_dir = files_dir
+        self.owners = owners
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.private = private
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='book-import')
+        self.book_field = Book._meta.get_field('book')
+        self.cover_field = Book._meta.get_field('cover')
+        self.search = get_search_backend()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def source(self, name):
+        return name if os.path.isabs(name) else os.path.join(self.files_dir, name)
+
+    def parse_private(self, value):
+        if value in (None, ''):
+            return self.private
+        return str(value).lower() in ('1', 'true', 'yes')
+
+    def build(self, row):
+        for column in ('title', 'description', 'book'):
+            if not (row.get(column) or '').strip():
+                raise ManifestError(f'missing {column}')
+        paths = {'book': self.source(row['book'])}
+        if row.get('cover'):
+            paths['cover'] = self.source(row['cover'])
+        for path in paths.values():
+            if not os.path.isfile(path):
+                raise ManifestError(f'file not found: {path}')
+
+        book_id = uuid.uuid5(IMPORT_NAMESPACE, str(row.get('id') or row['book']))
+        book = Book(
+            id=book_id,
+            title=row['title'].strip()[:Book._meta.get_field('title').max_length],
+            description=row['description'],
+            book_author=(row.get('book_author') or '').strip() or 'Unknown',
+            is_private=self.parse_private(row.get('is_private')),
+            user_id=self.owners(row.get('owner')),
+        )
+        # Storage names files by content; these names only pick the directory and extension.
+        book.book.name = self.book_field.generate_filename(book, os.path.basename(paths['book']))
+        if 'cover' in paths:
+            book.cover.name = self.cover_field.generate_filename(book, os.path.basename(paths['cover']))
+        return book, paths
+
+    def copy(self, job):
+        book, paths = job
+        copied = 0
+        for name, path in paths.items():
+            fieldfile = getattr(book, name)
+            storage = fieldfile.storage
+            size = os.path.getsize(path)
+            if not self.dry_run:
+                # A file copied by an earlier, interrupted run is stored once and only gains a reference.
+                with open(path, 'rb') as handle:
+                    fieldfile.name = storage.save(fieldfile.name, File(handle))
+            copied += size
+        return copied
+
+    def release(self, books):
+        # Every copy took a blob reference; books that were not inserted hand theirs back.
+        for book in books:
+            for fieldfile in (book.book, book.cover):
+                if is_blob(fieldfile.name):
+                    fieldfile.storage.delete(fieldfile.name)
+
+    def flush(self, jobs, stats):
+        if not self.dry_run:
+            # Rows committed before a crash would only add file references on a resumed run.
+            existing = set(Book.objects.filter(pk__in=[book.pk for book, _ in jobs]).values_list('pk', flat=True))
+            stats.skipped += sum(1 for book, _ in jobs if book.pk in existing)
+            jobs = [job for job in jobs if job[0].pk not in existing]
+        # Wait for every copy, failed or not, so a failure releases all the references taken.
+        futures = [self.executor.submit(self.copy, job) for job in jobs]
+        wait(futures)
+        books = [book for book, _ in jobs]
+        try:
+            for future in futures:
+                stats.bytes += future.result()
+            if self.dry_run:
+                stats.imported += len(jobs)
+                return
+            with transaction.atomic():
+                # Another run may have inserted some of these rows while the files were copied.
+                existing = set(Book.objects.filter(pk__in=[book.pk for book in books]).values_list('pk', flat=True))
+                inserted = [book for book in books if book.pk not in existing]
+                Book.objects.bulk_create(inserted)
+                ensure_rankings(inserted)
+                self.search.index_books(inserted)
+        except BaseException:
+            if not self.dry_run:
+                self.release(books)
+            raise
+        self.release([book for book in books if book.pk in existing])
+        stats.imported += len(inserted)
+        stats.skipped += len(books) - len(inserted)
+
+    def run(self, rows, start=0, on_batch=None):
+        """Import `rows` from (line number, row) pairs, skipping the first `start` rows."""
+        stats = ImportStats()
+        jobs = []
+        position = 0
+        for position, (number, row) in enumerate(rows, 1):
+            if position <= start:
+                continue
+            stats.rows += 1
+            try:
+                jobs.append(self.build(row))
+            except (ManifestError, ValueError, KeyError) as exc:
+                stats.skipped += 1
+                if len(stats.errors) < self.max_errors:
+                    stats.errors.append(f'row {number}: {exc}')
+                continue
+            if len(jobs) >= self.batch_size:
+                self.flush(jobs, stats)
+                jobs = []
+                if on_batch:
+                    on_batch(position, stats)
+        if jobs:
+            self.flush(jobs, stats)
+        if on_batch and position > start:
+            on_batch(position, stats)
+        if stats.imported and not self.dry_run:
+            response_cache.bump(CATALOGUE)
+        return stats
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.books.similarity import TOP_K, build_similarities, refresh_all_stale
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "readers also liked" neighbour table from all ratings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+        parser.add_argument('--pending', action='store_true',
+                            help='Only refresh books whose ratings changed since their last refresh')
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            refreshed, failed = refresh_all_stale()
+            self.stdout.write(self.style.SUCCESS(f'Refreshed {refreshed} books, {failed} failures left queued'))
+            return
+        covered = build_similarities(k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f'Stored neighbours for {covered} books'))
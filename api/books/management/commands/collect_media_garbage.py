@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from api.books.storage import ContentAddressedStorage, collect_garbage
+
+
+class Command(BaseCommand):
+    help = ('Delete content-addressed media files that no book references any more, streaming the '
+            'storage directory instead of listing it; schedule it e.g. daily from cron')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help='Spare files and references touched more recently than this')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('The default storage is not ContentAddressedStorage')
+        removed, freed = collect_garbage(default_storage, timedelta(minutes=options['grace_minutes']),
+                                         options['batch_size'], options['dry_run'])
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {removed} files ({freed / 1024 / 1024:.1f} MiB)'))
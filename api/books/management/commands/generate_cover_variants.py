@@ -0,0 +1,32 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from api.books.images import COVER_VARIANTS, generate_cover_variants
+from api.books.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnail and WebP/AVIF cover variants for books whose variants are stale or missing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate every book, not only stale ones')
+        parser.add_argument('--check-files', action='store_true',
+                            help='Also regenerate books whose variant files are missing from storage')
+
+    def handle(self, *args, **options):
+        generated = 0
+        books = Book.objects.exclude(cover='').only('id', 'cover', 'cover_variants')
+        for book in books.iterator(chunk_size=500):
+            if options['all'] or self.is_stale(book, options['check_files']):
+                if generate_cover_variants(book.pk) is not None:
+                    generated += 1
+        self.stdout.write(self.style.SUCCESS(f'Generated cover variants for {generated} books'))
+
+    def is_stale(self, book, check_files):
+        variants = book.cover_variants or {}
+        if variants.get('source') != book.cover.name:
+            return True
+        if check_files:
+            paths = [path for name in COVER_VARIANTS for path in variants.get(name, {}).values()]
+            return not paths or not all(default_storage.exists(path) for path in paths)
+        return False
@@ -0,0 +1,86 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.books.importer import BookImporter, ManifestError, read_checkpoint, read_manifest, write_checkpoint
+from api.users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Import books from a CSV or JSONL manifest (title, description, book_author, book, cover, '
+            'is_private, owner, id) and a directory of book and cover files')
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifest')
+        parser.add_argument('--files-dir', help='Directory relative file paths are resolved against '
+                                                '(defaults to the manifest directory)')
+        parser.add_argument('--owner', help='Email of the user owning rows without an owner column')
+        parser.add_argument('--private', action='store_true', help='Default for rows without is_private')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=8, help='Parallel file copies')
+        parser.add_argument('--checkpoint', help='Progress file (defaults to <manifest>.checkpoint)')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--dry-run', action='store_true', help='Validate rows and files without writing')
+
+    def handle(self, *args, **options):
+        manifest = os.path.abspath(options['manifest'])
+        if not os.path.isfile(manifest):
+            raise CommandError(f'Manifest {manifest} does not exist')
+        checkpoint = options['checkpoint'] or f'{manifest}.checkpoint'
+
+        start = 0
+        state = None if options['restart'] or options['dry_run'] else read_checkpoint(checkpoint)
+        if state:
+            if state.get('manifest') != manifest:
+                raise CommandError(f'Checkpoint {checkpoint} belongs to {state.get("manifest")}; use --restart')
+            start = state['rows']
+            self.stdout.write(f'Resuming after row {start}')
+
+        importer = BookImporter(
+            files_dir=options['files_dir'] or os.path.dirname(manifest),
+            owners=self.owner_resolver(options['owner']),
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            dry_run=options['dry_run'],
+            private=options['private'],
+        )
+
+        def on_batch(position, stats):
+            if not options['dry_run']:
+                write_checkpoint(checkpoint, {'manifest': manifest, 'rows': position})
+            rows_per_second, mb_per_second = stats.rate()
+            self.stdout.write(f'row {position}: {stats.imported} imported, {stats.skipped} skipped, '
+                              f'{rows_per_second:.0f} rows/s, {mb_per_second:.1f} MB/s')
+
+        try:
+            stats = importer.run(read_manifest(manifest), start=start, on_batch=on_batch)
+        finally:
+            importer.close()
+
+        for error in stats.errors:
+            self.stderr.write(error)
+        rows_per_second, mb_per_second = stats.rate()
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {stats.imported} of {stats.rows} rows ({stats.skipped} skipped) in {stats.seconds:.1f}s: '
+            f'{rows_per_second:.0f} rows/s, {stats.bytes / (1024 * 1024):.1f} MB at {mb_per_second:.1f} MB/s'
+        ))
+        if stats.imported and not options['dry_run']:
+            self.stdout.write('Run generate_cover_variants to prebuild cover thumbnails')
+
+    def owner_resolver(self, default_email):
+        cache = {}
+
+        def resolve(email):
+            email = (email or default_email or '').strip()
+            if not email:
+                raise ManifestError('no owner given and --owner not set')
+            if email not in cache:
+                cache[email] = User.objects.filter(email=email).values_list('pk', flat=True).first()
+            if cache[email] is None:
+                raise ManifestError(f'unknown owner {email}')
+            return cache[email]
+
+        if default_email:
+            resolve(None)
+        return resolve
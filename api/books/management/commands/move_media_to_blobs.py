@@ -0,0 +1,81 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from api.books.images import COVER_VARIANTS
+from api.books.models import Book
+from api.books.storage import ContentAddressedStorage, is_blob
+
+
+class Command(BaseCommand):
+    help = ('Move book files, covers and cover variants stored under their original names into '
+            'content-addressed storage, merging duplicates; safe to re-run after an interruption')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--keep-originals', action='store_true', help='Leave the old files in place')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('The default storage is not ContentAddressedStorage')
+        self.moved = self.missing = 0
+        legacy = Q(book__gt='') & ~Q(book__regex=r'/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}')
+        legacy |= Q(cover__gt='') & ~Q(cover__regex=r'/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}')
+        books = Book.objects.only('id', 'book', 'cover', 'cover_variants').order_by('pk')
+        last = None
+        while True:
+            batch = list((books.filter(pk__gt=last) if last else books)[:options['batch_size']])
+            if not batch:
+                break
+            last = batch[-1].pk
+            self.move_batch([book for book in batch if self.needs_move(book)], options['keep_originals'])
+            self.stdout.write(f'{self.moved} files moved, {self.missing} missing, up to book {last}')
+        left = Book.objects.filter(legacy).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {self.moved} files; {self.missing} were missing; {left} books still point at old names'))
+
+    def needs_move(self, book):
+        names = [book.book.name, book.cover.name] + self.variant_names(book)
+        return any(name and not is_blob(name) for name in names)
+
+    def variant_names(self, book):
+        variants = book.cover_variants or {}
+        return [path for name in COVER_VARIANTS for path in variants.get(name, {}).values()]
+
+    def adopt(self, name):
+        if not name or is_blob(name):
+            return name
+        if not default_storage.exists(name):
+            self.missing += 1
+            return name
+        with default_storage.open(name, 'rb') as handle:
+            blob = default_storage.save(name, handle)
+        self.moved += 1
+        return blob
+
+    def move_batch(self, books, keep_originals):
+        if not books:
+            return
+        originals = set()
+        with transaction.atomic():
+            for book in books:
+                for field in (book.book, book.cover):
+                    blob = self.adopt(field.name)
+                    if blob != field.name:
+                        originals.add(field.name)
+                        field.name = blob
+                variants = dict(book.cover_variants or {})
+                for name in COVER_VARIANTS:
+                    if name in variants:
+                        variants[name] = {fmt: self.adopt(path) for fmt, path in variants[name].items()}
+                        originals.update(set(book.cover_variants[name].values()) - set(variants[name].values()))
+                if variants.get('source'):
+                    variants['source'] = book.cover.name
+                book.cover_variants = variants
+            Book.objects.bulk_update(books, ['book', 'cover', 'cover_variants'])
+        if not keep_originals:
+            for name in originals:
+                # Several books may share an old file; it goes once the last of them has moved.
+                if not Book.objects.filter(Q(book=name) | Q(cover=name)).exists():
+                    default_storage.delete(name)
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.books.models import BookUpload
+from api.books.uploads import discard_part
+
+
+class Command(BaseCommand):
+    help = 'Delete resumable book uploads that were never finalized'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-hours', type=int, default=48)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['older_than_hours'])
+        purged = 0
+        for upload in BookUpload.objects.filter(created_at__lt=cutoff).iterator():
+            discard_part(upload)
+            upload.delete()
+            purged += 1
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} stale uploads'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.books.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized rating sum, count and star histogram of every book'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = rebuild_rating_aggregates(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} rated books'))
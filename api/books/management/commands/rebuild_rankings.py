@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.books.rankings import rebuild_rankings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the top-rated leaderboard scores and create missing BookRanking rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--reset-trending', action='store_true',
+                            help='Zero the trending scores, e.g. after changing the half-life')
+
+    def handle(self, *args, **options):
+        updated = rebuild_rankings(batch_size=options['batch_size'], reset_trending=options['reset_trending'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rankings for {updated} books'))
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:55
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    Rating = apps.get_model('books', 'Rating')
+    totals = Rating.objects.values('book_id').annotate(
+        rating_sum=Sum('rating'),
+        rating_count=Count('id'),
+        **{f'rating_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)}
+    ).order_by()
+    for row in totals.iterator():
+        Book.objects.filter(pk=row.pop('book_id')).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_rename_views_count_book_view_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
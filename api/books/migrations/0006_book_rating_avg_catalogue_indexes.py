@@ -0,0 +1,42 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+
+def backfill_rating_avg(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    Book.objects.filter(rating_count__gt=0).update(
+        rating_avg=Cast(F('rating_sum'), FloatField()) / F('rating_count')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_book_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_avg, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['is_private', '-uploaded_at', '-id'], name='book_public_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['is_private', '-view_count', '-id'], name='book_public_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['is_private', '-rating_avg', '-id'], name='book_public_rating_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:20
+
+from django.db import migrations
+
+# The DDL is inlined so this migration keeps working whatever later
+# happens to api.books.search.
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS books_book_fts USING fts5("
+    "book_id UNINDEXED, title, book_author, description, tokenize='unicode61 remove_diacritics 2')"
+)
+SQLITE_POPULATE = (
+    'INSERT INTO books_book_fts (book_id, title, book_author, description) '
+    'SELECT id, title, book_author, description FROM books_book'
+)
+POSTGRES_CREATE = (
+    "CREATE INDEX IF NOT EXISTS book_search_idx ON books_book USING GIN (("
+    "setweight(to_tsvector('simple', coalesce(\"books_book\".\"title\", '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(\"books_book\".\"book_author\", '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(\"books_book\".\"description\", '')), 'C')))"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        schema_editor.execute(SQLITE_POPULATE)
+    elif vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_CREATE)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS books_book_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS book_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_rating_avg_catalogue_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:15
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def dedupe_ratings(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    Rating = apps.get_model('books', 'Rating')
+    duplicates = Rating.objects.values('book_id', 'user_id').annotate(copies=Count('id')).filter(copies__gt=1)
+    touched = set()
+    for row in duplicates.order_by().iterator():
+        # Ratings carry no timestamp, so which copy survives is arbitrary.
+        ids = list(Rating.objects.filter(book_id=row['book_id'], user_id=row['user_id'])
+                   .order_by('id').values_list('id', flat=True))
+        Rating.objects.filter(id__in=ids[1:]).delete()
+        touched.add(row['book_id'])
+
+    totals = Rating.objects.filter(book_id__in=touched).values('book_id').annotate(
+        rating_sum=Sum('rating'),
+        rating_count=Count('id'),
+        **{f'rating_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)}
+    ).order_by()
+    for row in totals.iterator():
+        row['rating_avg'] = row['rating_sum'] / row['rating_count']
+        Book.objects.filter(pk=row.pop('book_id')).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_book_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_ratings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='rating',
+            constraint=models.UniqueConstraint(fields=('book', 'user'), name='unique_book_rating'),
+        ),
+    ]
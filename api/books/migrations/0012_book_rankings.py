@@ -0,0 +1,43 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_rankings(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    BookRanking = apps.get_model('books', 'BookRanking')
+    config = getattr(settings, 'BOOK_RANKING', {})
+    prior_mean, prior_weight = config.get('PRIOR_MEAN', 3.0), config.get('PRIOR_WEIGHT', 10)
+    batch = []
+    for book in Book.objects.only('id', 'is_private', 'rating_sum', 'rating_count').iterator(chunk_size=500):
+        score = (prior_weight * prior_mean + book.rating_sum) / (prior_weight + book.rating_count)
+        batch.append(BookRanking(book_id=book.pk, is_private=book.is_private, bayes_score=score))
+        if len(batch) >= 500:
+            BookRanking.objects.bulk_create(batch)
+            batch = []
+    BookRanking.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_rating_unique_book_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookRanking',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='books.book')),
+                ('is_private', models.BooleanField(default=False)),
+                ('bayes_score', models.FloatField(default=0)),
+                ('trending_score', models.FloatField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['is_private', '-bayes_score', '-book'], name='ranking_top_idx'), models.Index(fields=['is_private', '-trending_score', '-book'], name='ranking_trending_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_rankings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_book_rankings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_books', to='books.book')),
+                ('similar_book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.book')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='similarbook',
+            constraint=models.UniqueConstraint(fields=('book', 'rank'), name='unique_similar_book_rank'),
+        ),
+        migrations.AddConstraint(
+            model_name='similarbook',
+            constraint=models.UniqueConstraint(fields=('book', 'similar_book'), name='unique_similar_book'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0014_storedblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaleSimilarity',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='books.book')),
+                ('marked_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0015_stalesimilarity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookupload',
+            name='book',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload', to='books.book'),
+        ),
+        migrations.AddField(
+            model_name='bookupload',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -2,6 +2,7 @@ import uuid
 
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.utils import timezone
 
 from api.users.models import User
 
@@ -10,15 +11,77 @@ class Book(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
     title = models.CharField(max_length=155, db_index=True, null=False, blank=False)
     cover = models.ImageField(upload_to='medias/book/covers/')
+    cover_variants = models.JSONField(default=dict, blank=True)
     description = models.TextField(null=False, blank=False)
     book = models.FileField(upload_to='medias/book/books/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     book_author = models.CharField(max_length=60, db_index=True, default="Unknown")
     is_private = models.BooleanField(default=False)
     view_count = models.IntegerField(default=0)
 
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+    rating_avg = models.FloatField(default=0)
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='books_user')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_private', '-uploaded_at', '-id'], name='book_public_date_idx'),
+            models.Index(fields=['is_private', '-view_count', '-id'], name='book_public_views_idx'),
+            models.Index(fields=['is_private', '-rating_avg', '-id'], name='book_public_rating_idx'),
+        ]
+
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}') for star in range(5, 0, -1)}
+
+
+class BookRanking(models.Model):
+    """Materialized leaderboard scores, one row per book.
+
+    `is_private` mirrors the book so the leaderboard indexes cover the
+    catalogue filter. `trending_score` is the base-2 log of an exponentially
+    decayed view count, expressed relative to a fixed epoch so it only ever
+    needs increments; see api.books.rankings.
+    """
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='ranking')
+    is_private = models.BooleanField(default=False)
+    bayes_score = models.FloatField(default=0)
+    trending_score = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_private', '-bayes_score', '-book'], name='ranking_top_idx'),
+            models.Index(fields=['is_private', '-trending_score', '-book'], name='ranking_trending_idx'),
+        ]
+
+
+class SimilarBook(models.Model):
+    """Top-K item-item cosine neighbours of a book, rank 1 being the closest."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_books')
+    similar_book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'rank'], name='unique_similar_book_rank'),
+            models.UniqueConstraint(fields=['book', 'similar_book'], name='unique_similar_book'),
+        ]
+
+
+class StaleSimilarity(models.Model):
+    """A book whose neighbours need recomputing; the mark is removed only after a refresh succeeds."""
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    marked_at = models.DateTimeField(default=timezone.now)
+
 
 class Comment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
@@ -47,3 +110,35 @@ class Rating(models.Model):
     rating = models.IntegerField(default=1, validators=[MinValueValidator(1), MaxValueValidator(5)])
     user = models.ForeignKey(User, on_delete=models.DO_NOTHING, related_name='ratings_user')
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='ratings_book')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'user'], name='unique_book_rating')
+        ]
+
+
+class BookUpload(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    checksum = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set while one request turns the upload into a book, then the book it became.
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    book = models.OneToOneField(Book, null=True, blank=True, on_delete=models.SET_NULL, related_name='upload')
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='book_uploads')
+
+
+class StoredBlob(models.Model):
+    """Reference count of one content-addressed file; see api.books.storage."""
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='blob_unreferenced_idx', condition=models.Q(refcount__lte=0)),
+        ]
@@ -0,0 +1,150 @@
+import base64
+import binascii
+import datetime
+import json
+import uuid
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework import exceptions
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination that seeks on the full ordering tuple.
+
+    The view supplies the ordering through `get_cursor_ordering()`; its last
+    field must be unique (usually `-id`) so ties are broken deterministically
+    and every page is a single range scan on a matching index.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(view)
+        self.page_size = self.get_page_size(request)
+        position, self.reverse = self.decode_cursor(request, queryset)
+        self.has_cursor = position is not None
+
+        ordering = [self._flip(field) for field in self.ordering] if self.reverse else list(self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek_filter(ordering, position))
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+
+        self.has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_ordering(self, view):
+        if view is not None and hasattr(view, 'get_cursor_ordering'):
+            return tuple(view.get_cursor_ordering())
+        return self.ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.page or not (self.has_more or self.reverse):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.page or not (self.has_more if self.reverse else self.has_cursor):
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def decode_cursor(self, request, queryset=None):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position, reverse = payload['p'], bool(payload.get('r'))
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError('Cursor does not match the ordering')
+            if queryset is not None:
+                # The cursor is client data: coerce every value like the ORM would before it reaches SQL.
+                position = [self._field(queryset, field.lstrip('-')).to_python(value)
+                            for field, value in zip(self.ordering, position)]
+            if None in position:
+                raise ValueError('Cursor values cannot be null')
+        except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError, ValidationError):
+            raise exceptions.NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, obj, reverse):
+        return self.build_link(self.base_url, obj, self.ordering, reverse)
+
+    def build_link(self, url, obj, ordering, reverse=False):
+        position = [self._serialize(self._value(obj, field.lstrip('-'))) for field in ordering]
+        payload = json.dumps({'p': position, 'r': reverse}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _seek_filter(ordering, position):
+        # (a, b, c) after (x, y, z)  ==  a > x  OR  (a = x AND b > y)  OR  (a = x AND b = y AND c > z)
+        clauses = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {ordering[i].lstrip('-'): position[i] for i in range(index)}
+            clauses.append(Q(**equal, **{f'{name}__{lookup}': position[index]}))
+        # The redundant bound on the leading column lets the planner turn the
+        # disjunction into a single index range scan.
+        first = ordering[0]
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": position[0]})
+        return bound & reduce(lambda left, right: left | right, clauses)
+
+    @staticmethod
+    def _field(queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        model, *path, last = [queryset.model] + name.split('__')
+        try:
+            for part in path:
+                model = model._meta.get_field(part).related_model
+            return model._meta.get_field(last)
+        except FieldDoesNotExist:
+            raise ValueError(f'Cannot order a cursor on {name}')
+
+    @staticmethod
+    def _value(obj, field):
+        for attr in field.split('__'):
+            obj = getattr(obj, attr)
+        return obj
+
+    @staticmethod
+    def _serialize(value):
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        if isinstance(value, uuid.UUID):
+            return str(value)
+        return value
@@ -8,6 +8,4 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         return True
 
     def has_object_permission(self, request, view, obj):
-        user = request.user
-        print(user)
-        return obj.user == user
+        return obj.user_id == request.user.pk
@@ -0,0 +1,91 @@
+import datetime
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast, Greatest, Least, Log, Power
+
+from .models import Book, BookRanking
+
+_config = getattr(settings, 'BOOK_RANKING', {})
+PRIOR_MEAN = _config.get('PRIOR_MEAN', 3.0)
+PRIOR_WEIGHT = _config.get('PRIOR_WEIGHT', 10)
+HALF_LIFE = _config.get('TRENDING_HALF_LIFE_HOURS', 24) * 3600
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def bayes_score(rating_sum, rating_count):
+    """Average pulled towards PRIOR_MEAN as if every book had PRIOR_WEIGHT extra votes."""
+    return (PRIOR_WEIGHT * PRIOR_MEAN + rating_sum) / (PRIOR_WEIGHT + rating_count)
+
+
+def bayes_expression(rating_sum='rating_sum', rating_count='rating_count'):
+    return (Value(PRIOR_WEIGHT * PRIOR_MEAN) + Cast(F(rating_sum), FloatField())) / (
+        Value(float(PRIOR_WEIGHT)) + Cast(F(rating_count), FloatField())
+    )
+
+
+def view_weight(views, when):
+    """log2 of `views` seen at `when`, decayed relative to EPOCH."""
+    return math.log2(views) + (when - EPOCH) / HALF_LIFE
+
+
+def ranking_for(book):
+    return BookRanking(book_id=book.pk, is_private=book.is_private,
+                       bayes_score=bayes_score(book.rating_sum, book.rating_count))
+
+
+def ensure_rankings(books):
+    BookRanking.objects.bulk_create([ranking_for(book) for book in books], ignore_conflicts=True)
+
+
+def refresh_bayes(book_ids):
+    score = Book.objects.filter(pk=OuterRef('book_id')).annotate(score=bayes_expression()).values('score')[:1]
+    BookRanking.objects.filter(book_id__in=book_ids).update(bayes_score=Subquery(score))
+
+
+def record_views(batch, when=None):
+    """Fold a `{book_id: views}` batch into the trending scores with one UPDATE.
+
+    Adding 2**w to 2**score is done as max + log2(1 + 2**(min - max)) so the
+    stored logarithm never overflows however far from EPOCH we are.
+    """
+    if not batch:
+        return 0
+    when = datetime.datetime.now(datetime.timezone.utc).timestamp() if when is None else when
+    by_views = defaultdict(list)
+    for book_id, views in batch.items():
+        by_views[views].append(book_id)
+    weight = Case(
+        *[When(book_id__in=ids, then=Value(view_weight(views, when))) for views, ids in by_views.items()],
+        output_field=FloatField(),
+    )
+    high = Greatest(F('trending_score'), weight)
+    low = Least(F('trending_score'), weight)
+    return BookRanking.objects.filter(book_id__in=list(batch)).update(
+        trending_score=high + Log(Value(2.0), Value(1.0) + Power(Value(2.0), low - high))
+    )
+
+
+def rebuild_rankings(batch_size=500, reset_trending=False):
+    """Recompute every Bayesian score and create missing rows; trending is kept unless reset."""
+    updated = 0
+    with transaction.atomic():
+        books = Book.objects.only('id', 'is_private', 'rating_sum', 'rating_count').order_by('pk')
+        batch = []
+        for book in books.iterator(chunk_size=batch_size):
+            batch.append(ranking_for(book))
+            if len(batch) >= batch_size:
+                updated += _write(batch, reset_trending)
+                batch = []
+        if batch:
+            updated += _write(batch, reset_trending)
+    return updated
+
+
+def _write(rankings, reset_trending):
+    fields = ['is_private', 'bayes_score'] + (['trending_score'] if reset_trending else [])
+    BookRanking.objects.bulk_create(rankings, update_conflicts=True, unique_fields=['book'], update_fields=fields)
+    return len(rankings)
@@ -0,0 +1,130 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Now, NullIf
+
+from .cache import CATALOGUE, book_scope, response_cache
+from .models import Book, Rating
+from .rankings import refresh_bayes
+from .signals import ratings_changed
+from .similarity import schedule_refresh
+
+STARS = range(1, 6)
+AGGREGATE_FIELDS = ['rating_sum', 'rating_count', 'rating_avg'] + [f'rating_{star}' for star in STARS]
+COUNTER_FIELDS = ['rating_sum', 'rating_count'] + [f'rating_{star}' for star in STARS]
+
+
+def apply_rating_change(book_id, old=None, new=None):
+    """Shift the denormalized aggregates of a book from rating `old` to `new`.
+
+    Either side may be None for an insert or a delete. Must run inside the
+    transaction that writes the Rating row.
+    """
+    apply_rating_changes([(book_id, old, new)])
+
+
+def apply_rating_changes(changes):
+    """Apply many `(book_id, old, new)` rating changes with a single aggregate UPDATE.
+
+    Deltas are summed per book in Python, then every counter column is
+    shifted by a CASE over the books, grouped by delta so the statement stays
+    small. Bayesian scores, similarity refreshes and cache bumps are likewise
+    issued once for the whole batch.
+    """
+    deltas = defaultdict(Counter)
+    for book_id, old, new in changes:
+        delta = deltas[book_id]
+        if old is not None:
+            delta['rating_sum'] -= old
+            delta['rating_count'] -= 1
+            delta[f'rating_{old}'] -= 1
+        if new is not None:
+            delta['rating_sum'] += new
+            delta['rating_count'] += 1
+            delta[f'rating_{new}'] += 1
+    book_ids = [book_id for book_id, delta in deltas.items() if any(delta.values())]
+    if not book_ids:
+        return
+
+    columns = {}
+    for field in COUNTER_FIELDS:
+        by_delta = defaultdict(list)
+        for book_id in book_ids:
+            if deltas[book_id][field]:
+                by_delta[deltas[book_id][field]].append(book_id)
+        if by_delta:
+            columns[field] = F(field) + Case(
+                *[When(pk__in=ids, then=Value(value)) for value, ids in by_delta.items()],
+                default=Value(0), output_field=IntegerField(),
+            )
+    # Every right-hand side reads the pre-update row, so the average is
+    # derived from the new sum and count expressions rather than the columns.
+    columns['rating_avg'] = Coalesce(
+        Cast(columns.get('rating_sum', F('rating_sum')), FloatField())
+        / NullIf(columns.get('rating_count', F('rating_count')), 0),
+        0.0,
+    )
+    Book.objects.filter(pk__in=book_ids).update(updated_at=Now(), **columns)
+    refresh_bayes(book_ids)
+    schedule_refresh(book_ids)
+    response_cache.bump_on_commit(CATALOGUE, *[book_scope(book_id) for book_id in book_ids])
+
+
+def lock_books(book_ids):
+    """Lock the given books for the current transaction and return `{book_id: owner_id}`."""
+    return dict(Book.objects.select_for_update().filter(pk__in=book_ids).values_list('pk', 'user_id'))
+
+
+def upsert_ratings(user, ratings):
+    """Insert or replace the ratings of `user` from a `{book_id: rating}` mapping.
+
+    One SELECT reads the previous values, one INSERT ... ON CONFLICT DO UPDATE
+    writes every row and one UPDATE shifts the aggregates of every changed book. Callers
+    hold `lock_books` on the same books so concurrent submissions serialize.
+    """
+    existing = {
+        book_id: (pk, value)
+        for pk, book_id, value in Rating.objects.filter(user=user, book_id__in=list(ratings))
+        .values_list('id', 'book_id', 'rating')
+    }
+    rows = []
+    for book_id, value in ratings.items():
+        row = Rating(user=user, book_id=book_id, rating=value)
+        if book_id in existing:
+            # The conflict branch keeps the stored id; mirror it on the instance.
+            row.pk = existing[book_id][0]
+        rows.append(row)
+    Rating.objects.bulk_create(rows, update_conflicts=True, unique_fields=['book', 'user'], update_fields=['rating'])
+
+    changed = {book_id: value for book_id, value in ratings.items()
+               if book_id not in existing or existing[book_id][1] != value}
+    apply_rating_changes([(book_id, existing[book_id][1] if book_id in existing else None, value)
+                          for book_id, value in changed.items()])
+    if changed:
+        ratings_changed.send(sender=Rating, user=user, ratings=changed)
+    return rows
+
+
+def rebuild_rating_aggregates(batch_size=500):
+    totals = Rating.objects.values('book_id').annotate(
+        rating_sum=Sum('rating'),
+        rating_count=Count('id'),
+        **{f'rating_{star}': Count('id', filter=Q(rating=star)) for star in STARS}
+    ).order_by()
+
+    with transaction.atomic():
+        Book.objects.update(**{field: 0 for field in AGGREGATE_FIELDS})
+        batch = []
+        updated = 0
+        for row in totals.iterator():
+            book = Book(pk=row.pop('book_id'), rating_avg=row['rating_sum'] / row['rating_count'], **row)
+            batch.append(book)
+            if len(batch) >= batch_size:
+                Book.objects.bulk_update(batch, AGGREGATE_FIELDS)
+                updated += len(batch)
+                batch = []
+        if batch:
+            Book.objects.bulk_update(batch, AGGREGATE_FIELDS)
+            updated += len(batch)
+    return updated
@@ -0,0 +1,124 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+FTS_TABLE = 'books_book_fts'
+
+# title, book_author, description
+SQLITE_WEIGHTS = (10.0, 5.0, 1.0)
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(\"books_book\".\"title\", '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(\"books_book\".\"book_author\", '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(\"books_book\".\"description\", '')), 'C')"
+)
+
+
+class SQLiteBookSearch:
+    """FTS5 side table kept in sync from Book signals, ranked with bm25."""
+
+    def create_index(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"book_id UNINDEXED, title, book_author, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def drop_index(self, schema_editor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+    def index_books(self, books):
+        rows = [(book.pk.hex, book.title, book.book_author, book.description) for book in books]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE book_id = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (book_id, title, book_author, description) VALUES (%s, %s, %s, %s)', rows
+            )
+
+    def remove_books(self, book_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE book_id = %s', [(pk.hex,) for pk in book_ids])
+
+    def search(self, queryset, terms):
+        tokens = re.findall(r'\w+', terms)
+        if not tokens:
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        match = ' '.join('"{}"*'.format(token) for token in tokens)
+        book_table = queryset.model._meta.db_table
+        # Join the FTS table into the catalogue query itself, so visibility
+        # filters, ranking and the keyset page are all applied by one SELECT
+        # and every visible match can be paged to. bm25 is lower-is-better;
+        # negate it so every backend ranks descending.
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.book_id = {book_table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+        ).annotate(search_rank=RawSQL(f'-bm25({FTS_TABLE}, %s, %s, %s)', SQLITE_WEIGHTS, output_field=FloatField()))
+
+
+class PostgresBookSearch:
+    """Weighted tsvector expression with a GIN index; the database keeps it in sync."""
+
+    def create_index(self, schema_editor):
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS book_search_idx ON books_book USING GIN (({POSTGRES_DOCUMENT}))')
+
+    def drop_index(self, schema_editor):
+        schema_editor.execute('DROP INDEX IF EXISTS book_search_idx')
+
+    def index_books(self, books):
+        pass
+
+    def remove_books(self, book_ids):
+        pass
+
+    def search(self, queryset, terms):
+        query = "websearch_to_tsquery('simple', %s)"
+        return queryset.annotate(
+            search_match=RawSQL(f'{POSTGRES_DOCUMENT} @@ {query}', [terms], output_field=BooleanField()),
+            search_rank=RawSQL(f'ts_rank({POSTGRES_DOCUMENT}, {query})', [terms], output_field=FloatField()),
+        ).filter(search_match=True)
+
+
+class FallbackBookSearch:
+    def create_index(self, schema_editor):
+        pass
+
+    def drop_index(self, schema_editor):
+        pass
+
+    def index_books(self, books):
+        pass
+
+    def remove_books(self, book_ids):
+        pass
+
+    def search(self, queryset, terms):
+        condition = Q()
+        for token in terms.split():
+            condition &= Q(title__icontains=token) | Q(book_author__icontains=token) | Q(description__icontains=token)
+        return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def get_search_backend(vendor=None):
+    vendor = vendor or connection.vendor
+    if vendor == 'sqlite':
+        return SQLiteBookSearch()
+    if vendor == 'postgresql':
+        return PostgresBookSearch()
+    return FallbackBookSearch()
+
+
+class BookSearchFilter(filters.BaseFilterBackend):
+    search_param = 'search'
+
+    def get_search_terms(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend().search(queryset, terms)
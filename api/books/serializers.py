@@ -1,6 +1,29 @@
-from django.db.models import Count, Sum
+import re
+
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Book, Comment, Rating
+from .counters import view_counter
+from .images import cover_variant_urls
+from .models import Book, BookUpload, Comment, Rating, SimilarBook
+from .uploads import current_offset
+
+
+def download_url(book, request=None):
+    url = reverse('book-download', kwargs={'pk': book.pk})
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+class BookFileField(serializers.FileField):
+    """Accepts uploads like FileField but renders the ownership-checked download link.
+
+    serve_media refuses book files, so their raw media URL would only 404.
+    """
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return download_url(value.instance, self.context.get('request'))
 
 
 class CommentChildSerializer(serializers.ModelSerializer):
@@ -37,10 +60,11 @@ class CommentSerializer(serializers.ModelSerializer):
     content = serializers.CharField()
     reply_count = serializers.SerializerMethodField()
     replies = serializers.SerializerMethodField()
+    replies_next = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
-        fields = ['id', 'user', 'reply_count', 'changed', 'commented_at', 'content', 'replies']
+        fields = ['id', 'user', 'reply_count', 'changed', 'commented_at', 'content', 'replies', 'replies_next']
         extra_kwargs = {
             "user": {"read_only": True},
             "book": {"read_only": True},
@@ -55,46 +79,62 @@ class CommentSerializer(serializers.ModelSerializer):
         return instance
 
     def get_reply_count(self, obj):
+        if hasattr(obj, 'reply_total'):
+            return obj.reply_total
         return obj.children().count()
 
     def get_replies(self, obj):
-        return CommentChildSerializer(obj.children(), many=True).data
+        if hasattr(obj, 'preview_replies'):
+            return CommentChildSerializer(obj.preview_replies, many=True).data
+        return CommentChildSerializer(obj.children().select_related('user', 'child__user'), many=True).data
+
+    def get_replies_next(self, obj):
+        return getattr(obj, 'replies_next', None)
 
 
 class BookViewSerializer(serializers.ModelSerializer):
     rating = serializers.SerializerMethodField()
+    view_count = serializers.SerializerMethodField()
+    cover_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Book
-        fields = ['id', 'title', 'cover', 'book_author', 'rating', 'view_count', 'is_private']
-        read_only_fields = ['view_count']
+        fields = ['id', 'title', 'cover', 'cover_variants', 'book_author', 'rating', 'view_count', 'is_private']
 
     def get_rating(self, obj):
-        ratings = Rating.objects.filter(book=obj).aggregate(
-            total_rating=Sum('rating'),
-            rating_count=Count('rating')
-        )
+        return obj.rating_avg
+
+    def get_view_count(self, obj):
+        return obj.view_count + view_counter.pending(obj.pk)
+
+    def get_cover_variants(self, obj):
+        return cover_variant_urls(obj, self.context.get('request'))
+
 
-        if ratings['rating_count']:
-            avg_rating = ratings['total_rating'] / ratings['rating_count']
-        else:
-            avg_rating = 0
 
-        return avg_rating
 
+class SimilarBookSerializer(serializers.ModelSerializer):
+    book = BookViewSerializer(source='similar_book')
 
+    class Meta:
+        model = SimilarBook
+        fields = ['book', 'score', 'rank']
 
 
 class BookSerializer(serializers.ModelSerializer):
     rating = serializers.SerializerMethodField()
+    cover_variants = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+    view_count = serializers.SerializerMethodField()
+    book = BookFileField(max_length=Book._meta.get_field('book').max_length)
     user = serializers.CharField(source='user.email', read_only=True)
 
     class Meta:
         model = Book
         fields = ['id', 'title',
-                  'cover', 'description',
-                  'book',
-                  'rating', 'uploaded_at',
+                  'cover', 'cover_variants', 'description',
+                  'book', 'download_url',
+                  'rating', 'view_count', 'uploaded_at',
                   'is_private',
                   'book_author', 'user']
 
@@ -102,24 +142,19 @@ class BookSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         return Book.objects.create(user=user, **validated_data)
 
-    def get_rating(self, obj):
-        ratings = Rating.objects.filter(book=obj).aggregate(
-            total_rating=Sum('rating'),
-            rating_count=Count('rating')
-        )
+    def get_cover_variants(self, obj):
+        return cover_variant_urls(obj, self.context.get('request'))
+
+    def get_download_url(self, obj):
+        return download_url(obj, self.context.get('request'))
 
-        if ratings['rating_count']:
-            avg_rating = ratings['total_rating'] / ratings['rating_count']
-        else:
-            avg_rating = 0
+    def get_view_count(self, obj):
+        return obj.view_count + view_counter.pending(obj.pk)
 
+    def get_rating(self, obj):
         return {
-            'total': avg_rating,
-            5: Rating.objects.filter(book=obj, rating=5).count(),
-            4: Rating.objects.filter(book=obj, rating=4).count(),
-            3: Rating.objects.filter(book=obj, rating=3).count(),
-            2: Rating.objects.filter(book=obj, rating=2).count(),
-            1: Rating.objects.filter(book=obj, rating=1).count(),
+            'total': obj.rating_avg,
+            **obj.rating_histogram,
         }
 
 
@@ -128,3 +163,36 @@ class RatingSerializer(serializers.ModelSerializer):
         model = Rating
         fields = '__all__'
         read_only_fields = ['user', 'book']
+
+
+class BulkRatingItemSerializer(serializers.Serializer):
+    book = serializers.UUIDField()
+    rating = serializers.IntegerField(min_value=1, max_value=5)
+
+
+class BulkRatingSerializer(serializers.Serializer):
+    ratings = serializers.ListField(child=BulkRatingItemSerializer(), allow_empty=False,
+                                    max_length=settings.BULK_RATING_MAX)
+
+
+class BookUploadSerializer(serializers.ModelSerializer):
+    offset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BookUpload
+        fields = ['id', 'filename', 'size', 'checksum', 'offset', 'book', 'created_at']
+        read_only_fields = ['id', 'book', 'created_at']
+
+    def validate_size(self, value):
+        limit = settings.BOOK_UPLOAD_MAX_SIZE
+        if value <= 0 or value > limit:
+            raise serializers.ValidationError(f'Size must be between 1 and {limit} bytes')
+        return value
+
+    def validate_checksum(self, value):
+        if not re.fullmatch(r'[0-9a-fA-F]{64}', value):
+            raise serializers.ValidationError('Checksum must be a hex encoded SHA-256 digest')
+        return value.lower()
+
+    def get_offset(self, obj):
+        return current_offset(obj)
@@ -0,0 +1,89 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from .cache import CATALOGUE, book_scope, comments_scope, response_cache
+from .images import delete_cover_variants
+from .models import Book, BookRanking, Comment
+from .rankings import ranking_for
+from .search import get_search_backend
+
+SEARCH_FIELDS = {'title', 'book_author', 'description'}
+FILE_FIELDS = ('book', 'cover')
+
+# Sent with `user` and `ratings` ({book_id: rating}) after ratings are written;
+# bulk upserts bypass post_save.
+ratings_changed = Signal()
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    get_search_backend().index_books([instance])
+
+
+@receiver(post_save, sender=Book)
+def sync_ranking(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        ranking_for(instance).save(force_insert=True)
+    elif update_fields is None or 'is_private' in update_fields:
+        BookRanking.objects.filter(book_id=instance.pk).exclude(is_private=instance.is_private) \
+            .update(is_private=instance.is_private)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    get_search_backend().remove_books([instance.pk])
+
+
+@receiver(pre_save, sender=Book)
+def remember_book_files(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._stored_files = {}
+    if raw or instance._state.adding:
+        return
+    fields = [name for name in FILE_FIELDS if update_fields is None or name in update_fields]
+    if fields:
+        instance._stored_files = Book.objects.filter(pk=instance.pk).values(*fields).first() or {}
+
+
+@receiver(post_save, sender=Book)
+def release_replaced_files(sender, instance, **kwargs):
+    # Storage names are references: a replaced file gives its one back once the new name is committed.
+    replaced = [(getattr(instance, field).storage, name)
+                for field, name in getattr(instance, '_stored_files', {}).items()
+                if name and name != getattr(instance, field).name]
+    instance._stored_files = {}
+    if not replaced:
+        return
+
+    def release():
+        for storage, name in replaced:
+            storage.delete(name)
+
+    transaction.on_commit(release)
+
+
+@receiver(post_delete, sender=Book)
+def delete_book_files(sender, instance, **kwargs):
+    files = [field for field in (instance.book, instance.cover) if field]
+    variants = instance.cover_variants
+
+    def delete():
+        for field in files:
+            field.storage.delete(field.name)
+        delete_cover_variants(variants)
+
+    transaction.on_commit(delete)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book(sender, instance, **kwargs):
+    response_cache.bump_on_commit(book_scope(instance.pk), CATALOGUE)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(sender, instance, **kwargs):
+    response_cache.bump_on_commit(comments_scope(instance.book_id))
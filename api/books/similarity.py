@@ -0,0 +1,190 @@
+import heapq
+import logging
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import Rating, SimilarBook, StaleSimilarity
+from .tasks import CoalescedTask
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'BOOK_SIMILARITY', {})
+TOP_K = _config.get('TOP_K', 20)
+MIN_CORATERS = _config.get('MIN_CORATERS', 2)
+# Users with more ratings than this add O(n^2) pairs and little signal.
+MAX_USER_RATINGS = _config.get('MAX_USER_RATINGS', 500)
+REFRESH_BATCH_SIZE = _config.get('REFRESH_BATCH_SIZE', 100)
+
+
+def _user_rows(ratings):
+    """Group a (user_id, book_id, rating) stream ordered by user into sparse rows."""
+    current, row = None, []
+    for user_id, book_id, value in ratings:
+        if user_id != current:
+            if row:
+                yield row
+            current, row = user_id, []
+        row.append((book_id, value))
+    if row:
+        yield row
+
+
+def _accumulate(rows):
+    """Sparse co-rating products: dots[i][j] = sum_u r_ui * r_uj, plus pair supports and squared norms."""
+    dots = defaultdict(lambda: defaultdict(float))
+    support = defaultdict(lambda: defaultdict(int))
+    norms = defaultdict(float)
+    for row in rows:
+        for book_id, value in row:
+            norms[book_id] += value * value
+        if len(row) > MAX_USER_RATINGS:
+            continue
+        for index, (left, left_value) in enumerate(row):
+            for right, right_value in row[index + 1:]:
+                product = left_value * right_value
+                dots[left][right] += product
+                dots[right][left] += product
+                support[left][right] += 1
+                support[right][left] += 1
+    return dots, support, norms
+
+
+def _neighbours(book_id, dots, support, norms, k=TOP_K):
+    scores = (
+        (dot / math.sqrt(norms[book_id] * norms[other]), other)
+        for other, dot in dots[book_id].items()
+        if support[book_id][other] >= MIN_CORATERS
+    )
+    return heapq.nlargest(k, scores)
+
+
+def _rows_for(book_id, neighbours):
+    return [
+        SimilarBook(book_id=book_id, similar_book_id=other, score=score, rank=rank)
+        for rank, (score, other) in enumerate(neighbours, 1)
+    ]
+
+
+def build_similarities(k=TOP_K, batch_size=1000):
+    """Rebuild the whole neighbour table from the Rating matrix; returns the number of books covered."""
+    started = timezone.now()
+    ratings = Rating.objects.order_by('user_id').values_list('user_id', 'book_id', 'rating')
+    dots, support, norms = _accumulate(_user_rows(ratings.iterator(chunk_size=5000)))
+
+    with transaction.atomic():
+        SimilarBook.objects.all().delete()
+        batch, covered = [], 0
+        for book_id in dots:
+            rows = _rows_for(book_id, _neighbours(book_id, dots, support, norms, k))
+            if rows:
+                covered += 1
+                batch.extend(rows)
+            if len(batch) >= batch_size:
+                SimilarBook.objects.bulk_create(batch)
+                batch = []
+        SimilarBook.objects.bulk_create(batch)
+        # Ratings behind these marks were read above; later marks still need their refresh.
+        StaleSimilarity.objects.filter(marked_at__lte=started).delete()
+    return covered
+
+
+def refresh_book(book_id, k=TOP_K):
+    """Recompute one book's row of the similarity matrix after its ratings changed.
+
+    Its own neighbour list is rebuilt exactly. Each co-rated book only has
+    this book's entry inserted, moved or dropped, so such a list may hold
+    fewer than K rows until the next full build refills it.
+    """
+    raters = Rating.objects.filter(book_id=book_id).values('user_id')
+    ratings = Rating.objects.filter(user_id__in=raters).order_by('user_id').values_list('user_id', 'book_id', 'rating')
+
+    dots, support = defaultdict(float), defaultdict(int)
+    for row in _user_rows(ratings.iterator()):
+        own = dict(row).get(book_id)
+        if own is None or len(row) > MAX_USER_RATINGS:
+            continue
+        for other, value in row:
+            if other != book_id:
+                dots[other] += own * value
+                support[other] += 1
+    candidates = [other for other in dots if support[other] >= MIN_CORATERS]
+    norms = dict(
+        Rating.objects.filter(book_id__in=[book_id, *candidates]).values('book_id')
+        .annotate(norm=Sum(F('rating') * F('rating'))).order_by().values_list('book_id', 'norm')
+    )
+    scores = {}
+    if norms.get(book_id):
+        scores = {other: dots[other] / math.sqrt(norms[book_id] * norms[other]) for other in candidates}
+
+    with transaction.atomic():
+        SimilarBook.objects.filter(book_id=book_id).delete()
+        top = heapq.nlargest(k, ((score, other) for other, score in scores.items()))
+        SimilarBook.objects.bulk_create(_rows_for(book_id, top))
+
+        existing = defaultdict(dict)
+        rows = SimilarBook.objects.filter(Q(book_id__in=candidates) | Q(similar_book_id=book_id))
+        for row in rows:
+            existing[row.book_id][row.similar_book_id] = row.score
+
+        changed, batch = [], []
+        for other in set(candidates) | set(existing):
+            current = existing[other]
+            neighbours = {similar: score for similar, score in current.items() if similar != book_id}
+            if other in scores:
+                neighbours[book_id] = scores[other]
+            ranked = heapq.nlargest(k, ((score, similar) for similar, score in neighbours.items()))
+            if ranked != heapq.nlargest(k, ((score, similar) for similar, score in current.items())):
+                changed.append(other)
+                batch.extend(_rows_for(other, ranked))
+        SimilarBook.objects.filter(book_id__in=changed).delete()
+        SimilarBook.objects.bulk_create(batch)
+
+
+def schedule_refresh(book_ids):
+    """Mark books stale in the current transaction and refresh them once it commits.
+
+    The marks commit with the ratings that caused them, so a refresh that
+    fails or never runs is retried by the next drain or by
+    `build_book_similarities --pending`.
+    """
+    now = timezone.now()
+    StaleSimilarity.objects.bulk_create(
+        [StaleSimilarity(book_id=book_id, marked_at=now) for book_id in book_ids],
+        update_conflicts=True, unique_fields=['book'], update_fields=['marked_at'],
+    )
+    _refresh_task.schedule()
+
+
+def refresh_stale(batch_size=REFRESH_BATCH_SIZE):
+    """Refresh one batch of stale books; returns (refreshed, failed)."""
+    refreshed = failed = 0
+    marks = StaleSimilarity.objects.order_by('marked_at').values_list('book_id', 'marked_at')[:batch_size]
+    for book_id, marked_at in list(marks):
+        try:
+            refresh_book(book_id)
+        except Exception:
+            logger.warning('Refreshing the neighbours of book %s failed; it stays queued', book_id, exc_info=True)
+            failed += 1
+            continue
+        # A rating that re-marked the book mid-refresh keeps its newer mark.
+        StaleSimilarity.objects.filter(book_id=book_id, marked_at__lte=marked_at).delete()
+        refreshed += 1
+    return refreshed, failed
+
+
+def refresh_all_stale(batch_size=REFRESH_BATCH_SIZE):
+    """Drain the stale marks; stops early when a whole batch fails so failures wait for the next drain."""
+    refreshed = failed = 0
+    while True:
+        done, errors = refresh_stale(batch_size)
+        refreshed, failed = refreshed + done, failed + errors
+        if not done:
+            return refreshed, failed
+
+
+_refresh_task = CoalescedTask(refresh_all_stale)
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from datetime import timedelta
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+BLOB_RE = re.compile(r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})(?:\.\w{1,10})?$')
+TMP_DIR = '.blob-tmp'
+HASH_BUFFER = 1024 * 1024
+
+
+def is_blob(name):
+    return bool(name and BLOB_RE.search(name))
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(HASH_BUFFER), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Store each file once under its SHA-256, sharded as `<upload_to>/ab/cd/<sha256><ext>`.
+
+    The directory of the requested name is kept as a namespace, so book files
+    stay apart from the public covers. Every save adds a reference in
+    StoredBlob and every delete drops one; unreferenced files are reclaimed
+    by `collect_garbage`. Names that are not blobs (files stored before the
+    move) keep plain FileSystemStorage behaviour.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name depends on the content; identical files are meant to share it.
+        return name
+
+    def _save(self, name, content):
+        tmp_dir = self.path(TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                os.close(fd)
+                file_move_safe(content.temporary_file_path(), tmp, allow_overwrite=True)
+                digest = _hash_file(tmp)
+            else:
+                hasher = hashlib.sha256()
+                with os.fdopen(fd, 'wb') as handle:
+                    for chunk in content.chunks():
+                        if isinstance(chunk, str):
+                            chunk = chunk.encode('utf-8')
+                        hasher.update(chunk)
+                        handle.write(chunk)
+                digest = hasher.hexdigest()
+
+            extension = os.path.splitext(name)[1].lower()
+            blob = posixpath.join(posixpath.dirname(name), digest[:2], digest[2:4], digest + extension)
+            # Reference first, then place the file: the collector deletes a row
+            # and its file in one transaction, so it either sees this reference
+            # or has finished before the file is (re)written below.
+            self.reference(blob, os.path.getsize(tmp))
+            full_path = self.path(blob)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp, self.file_permissions_mode)
+            os.replace(tmp, full_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return blob
+
+    def reference(self, name, size):
+        from .models import StoredBlob
+
+        now = timezone.now()
+        blobs = StoredBlob.objects.filter(name=name)
+        if blobs.update(refcount=F('refcount') + 1, updated_at=now):
+            return
+        try:
+            with transaction.atomic():
+                StoredBlob.objects.create(name=name, size=size, refcount=1, updated_at=now)
+        except IntegrityError:
+            blobs.update(refcount=F('refcount') + 1, updated_at=now)
+
+    def delete(self, name):
+        if not is_blob(name):
+            return super().delete(name)
+        from .models import StoredBlob
+
+        StoredBlob.objects.filter(name=name, refcount__gt=0) \
+            .update(refcount=F('refcount') - 1, updated_at=timezone.now())
+
+
+def _walk(path):
+    """Yield file entries below `path` without building a listing; only directory paths wait on the stack."""
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def collect_garbage(storage, grace=timedelta(hours=1), batch_size=500, dry_run=False):
+    """Reclaim blobs nobody references; returns (files removed, bytes freed).
+
+    Rows at refcount zero go first, each deleted together with its file.
+    Then a streaming walk of the storage root removes blob files without a
+    row (left by rolled-back transactions) and stale temporary files. Both
+    passes spare anything touched within `grace`, which covers saves still
+    in flight.
+    """
+    from .models import StoredBlob
+
+    cutoff = timezone.now() - grace
+    removed = freed = 0
+    stale = StoredBlob.objects.filter(refcount__lte=0, updated_at__lt=cutoff)
+    last = ''
+    while True:
+        batch = list(stale.filter(name__gt=last).order_by('name').values_list('name', 'size')[:batch_size])
+        if not batch:
+            break
+        last = batch[-1][0]
+        for name, size in batch:
+            if dry_run:
+                removed, freed = removed + 1, freed + size
+                continue
+            with transaction.atomic():
+                if StoredBlob.objects.filter(name=name, refcount__lte=0, updated_at__lt=cutoff).delete()[0]:
+                    FileSystemStorage.delete(storage, name)
+                    removed, freed = removed + 1, freed + size
+
+    root = os.path.abspath(storage.location)
+    if not os.path.isdir(root):
+        return removed, freed
+    deadline = cutoff.timestamp()
+    pending = {}
+
+    def sweep():
+        nonlocal removed, freed
+        known = set(StoredBlob.objects.filter(name__in=list(pending)).values_list('name', flat=True))
+        for name, (path, size) in pending.items():
+            if name not in known:
+                if not dry_run:
+                    try:
+                        # A save may have re-placed the file since the walk saw it.
+                        if os.stat(path).st_mtime >= deadline:
+                            continue
+                        os.remove(path)
+                    except FileNotFoundError:
+                        continue
+                removed, freed = removed + 1, freed + size
+        pending.clear()
+
+    for entry in _walk(root):
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_mtime >= deadline:
+            continue
+        name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+        if name.startswith(TMP_DIR + '/'):
+            if not dry_run:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+            removed, freed = removed + 1, freed + stat.st_size
+        elif is_blob(name):
+            pending[name] = (entry.path, stat.st_size)
+            if len(pending) >= batch_size:
+                sweep()
+    if pending:
+        sweep()
+    return removed, freed
@@ -0,0 +1,118 @@
+import mimetypes
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """Return (start, end) inclusive, None to send the whole file, or False if unsatisfiable.
+
+    Only a single range is honoured; multi-range requests get the full body,
+    which RFC 9110 allows.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(modified)
+
+
+def _iter_range(handle, start, length):
+    try:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def _offload_response(name, storage):
+    offload = getattr(settings, 'MEDIA_OFFLOAD', None)
+    if not offload:
+        return None
+    response = HttpResponse()
+    header = offload.get('HEADER', 'X-Accel-Redirect')
+    if header == 'X-Accel-Redirect':
+        response[header] = offload.get('PREFIX', '/protected-media/') + name
+    else:
+        response[header] = storage.path(name)
+    # Let the proxy fill in the type and length from the file it serves.
+    del response['Content-Type']
+    return response
+
+
+def ranged_file_response(request, storage, name, as_attachment=False):
+    """Serve a stored file with validators and single-range support.
+
+    When MEDIA_OFFLOAD is configured the bytes are left to the front proxy
+    through X-Accel-Redirect or X-Sendfile.
+    """
+    size = storage.size(name)
+    modified = storage.get_modified_time(name).timestamp()
+    etag = quote_etag(f'{size:x}-{int(modified * 1000000):x}')
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(modified))
+    if not_modified is not None:
+        return not_modified
+
+    filename = name.rsplit('/', 1)[-1]
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response = _offload_response(name, storage)
+    if response is None:
+        byte_range = None
+        if _if_range_matches(request, etag, modified):
+            byte_range = parse_range(request.headers.get('Range'), size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is None:
+            response = FileResponse(storage.open(name, 'rb'), content_type=content_type,
+                                    as_attachment=as_attachment, filename=filename)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(_iter_range(storage.open(name, 'rb'), start, end - start + 1),
+                                             status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+    else:
+        disposition = 'attachment' if as_attachment else 'inline'
+        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified)
+    return response
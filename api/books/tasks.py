@@ -0,0 +1,71 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'BACKGROUND_TASK_WORKERS', 2),
+    thread_name_prefix='books-task',
+)
+
+
+def run_in_background(func, *args, **kwargs):
+    """Run `func` on the worker pool once the current transaction commits.
+
+    With BACKGROUND_TASKS_EAGER it runs inline after the commit instead and
+    its errors propagate, so benchmarks and tests see every write it makes.
+    """
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        transaction.on_commit(lambda: func(*args, **kwargs))
+    else:
+        transaction.on_commit(lambda: _executor.submit(_run, func, *args, **kwargs))
+
+
+def _run(func, *args, **kwargs):
+    close_old_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', getattr(func, '__name__', func))
+    finally:
+        close_old_connections()
+
+
+class CoalescedTask:
+    """A background job for draining a durable queue: at most one run per process at a time.
+
+    Scheduling while a run is in progress makes that run go round once more
+    instead of starting another, so bursts of writes cost one drain.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self._lock = threading.Lock()
+        self._running = False
+        self._requested = False
+
+    def schedule(self):
+        run_in_background(self.run)
+
+    def run(self):
+        with self._lock:
+            self._requested = True
+            if self._running:
+                return
+            self._running = True
+        try:
+            while True:
+                with self._lock:
+                    if not self._requested:
+                        self._running = False
+                        return
+                    self._requested = False
+                self.func()
+        except BaseException:
+            with self._lock:
+                self._running = False
+            raise
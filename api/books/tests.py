@@ -0,0 +1,536 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection
+from django.db.models.signals import post_save
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from api.books.cache import book_scope, comments_scope, response_cache
+from api.books.counters import view_counter
+from api.books.images import generate_cover_variants
+from api.books.importer import BookImporter
+from api.books.models import Book, BookUpload, Rating, SimilarBook, StaleSimilarity, StoredBlob
+from api.books.ratings import upsert_ratings
+from api.books.similarity import refresh_stale
+from api.books.storage import collect_garbage
+from api.books.uploads import claim, part_path
+from api.books.views import serve_media
+from api.conditional import make_etag
+from api.users.models import User
+
+
+class MediaRootMixin:
+    def use_temporary_media_root(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        return media_root.name
+
+
+class ServeMediaTests(MediaRootMixin, SimpleTestCase):
+    def setUp(self):
+        media_root = self.use_temporary_media_root()
+        for name in ('medias/book/books/ab/cd/secret.pdf', 'medias/book/covers/cover.jpg'):
+            path = os.path.join(media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as handle:
+                handle.write(b'data')
+        self.factory = RequestFactory()
+
+    def serve(self, path):
+        return serve_media(self.factory.get(f'/media/{path}'), path)
+
+    def test_serves_covers(self):
+        self.assertEqual(self.serve('medias/book/covers/cover.jpg').status_code, 200)
+
+    def test_hides_book_files(self):
+        for path in (
+            'medias/book/books/ab/cd/secret.pdf',
+            './medias/book/books/ab/cd/secret.pdf',
+            'medias//book/books/ab/cd/secret.pdf',
+            '/medias/book/books/ab/cd/secret.pdf',
+            'a/../medias/book/books/ab/cd/secret.pdf',
+            'medias/book/covers/../books/ab/cd/secret.pdf',
+            'medias/./book/books/ab/cd/secret.pdf',
+        ):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.serve(path)
+
+    def test_media_url_routes_through_serve_media(self):
+        self.assertEqual(self.client.get('/media/medias/book/covers/cover.jpg').status_code, 200)
+        self.assertEqual(self.client.get('/media/medias/book/books/ab/cd/secret.pdf').status_code, 404)
+
+
+class StoredBlobTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        self.use_temporary_media_root()
+        self.user = User.objects.create_user(email='owner@example.com', name='owner', password='Passw0rdX')
+
+    def create_book(self, cover=b'cover', book=b'%PDF-1.4'):
+        # Private books stay out of the feed fan-out.
+        return Book.objects.create(user=self.user, title='Title', description='Description', is_private=True,
+                                   cover=ContentFile(cover, name='cover.jpg'),
+                                   book=ContentFile(book, name='book.pdf'))
+
+    def refcount(self, name):
+        return StoredBlob.objects.get(name=name).refcount
+
+    def test_identical_files_share_one_blob(self):
+        first, second = self.create_book(), self.create_book()
+        self.assertEqual(first.book.name, second.book.name)
+        self.assertEqual(self.refcount(first.book.name), 2)
+        self.assertNotEqual(first.cover.name, first.book.name)
+
+    def test_replacing_a_file_releases_the_old_blob(self):
+        book = self.create_book()
+        old_cover, old_book = book.cover.name, book.book.name
+        self.assertEqual(self.refcount(old_cover), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.cover = ContentFile(b'new cover', name='cover.jpg')
+            book.save()
+
+        self.assertEqual(self.refcount(old_cover), 0)
+        self.assertEqual(self.refcount(book.cover.name), 1)
+        self.assertEqual(self.refcount(old_book), 1)
+
+    def test_saving_other_fields_keeps_references(self):
+        book = self.create_book()
+        with self.captureOnCommitCallbacks(execute=True):
+            book.title = 'Renamed'
+            book.save()
+        self.assertEqual(self.refcount(book.cover.name), 1)
+        self.assertEqual(self.refcount(book.book.name), 1)
+
+    def test_deleting_a_book_releases_its_blobs(self):
+        book = self.create_book()
+        names = [book.cover.name, book.book.name]
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        self.assertEqual([self.refcount(name) for name in names], [0, 0])
+
+    def test_garbage_collection_removes_unreferenced_blobs_only(self):
+        kept, dropped = self.create_book(cover=b'kept'), self.create_book(cover=b'dropped')
+        with self.captureOnCommitCallbacks(execute=True):
+            dropped.delete()
+
+        collect_garbage(default_storage, grace=timedelta(0))
+
+        self.assertFalse(default_storage.exists(dropped.cover.name))
+        self.assertFalse(StoredBlob.objects.filter(name=dropped.cover.name).exists())
+        self.assertTrue(default_storage.exists(kept.cover.name))
+        # The PDF is shared by both books and still referenced by the kept one.
+        self.assertTrue(default_storage.exists(kept.book.name))
+        self.assertEqual(self.refcount(kept.book.name), 1)
+
+    def write_file(self, name, age):
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as handle:
+            handle.write(b'orphan')
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+        return path
+
+    def test_garbage_collection_sweeps_files_without_rows(self):
+        digest = hashlib.sha256(b'orphan').hexdigest()
+        orphan = self.write_file(f'medias/book/books/{digest[:2]}/{digest[2:4]}/{digest}.pdf', age=7200)
+        leftover = self.write_file('.blob-tmp/tmpabc', age=7200)
+        recent = self.write_file('.blob-tmp/tmpdef', age=0)
+        legacy = self.write_file('medias/book/books/legacy.pdf', age=7200)
+
+        self.assertEqual(collect_garbage(default_storage, dry_run=True), (2, 12))
+        self.assertTrue(os.path.exists(orphan))
+
+        self.assertEqual(collect_garbage(default_storage), (2, 12))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertFalse(os.path.exists(leftover))
+        # In-flight saves and files stored before content addressing are left alone.
+        self.assertTrue(os.path.exists(recent))
+        self.assertTrue(os.path.exists(legacy))
+
+    def test_released_blob_is_kept_within_the_grace_period(self):
+        book = self.create_book()
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        self.assertEqual(collect_garbage(default_storage), (0, 0))
+        self.assertTrue(default_storage.exists(book.book.name))
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(email='owner@example.com', name='owner', password='Passw0rdX')
+        Book.objects.bulk_create([
+            Book(user=user, title=f'Book {index}', description='Description',
+                 cover='medias/book/covers/cover.jpg', book='medias/book/books/book.pdf')
+            for index in range(5)
+        ])
+
+    @staticmethod
+    def cursor(position):
+        return base64.urlsafe_b64encode(json.dumps({'p': position}).encode()).decode()
+
+    def test_pages_follow_the_next_link(self):
+        seen = []
+        url = '/api/books/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [book['id'] for book in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_malformed_cursor_values_are_not_found(self):
+        for position in (['not-a-date', 'x'], ['2024-01-01T00:00:00Z', 'not-a-uuid'], [1, 2], [None, None], ['x']):
+            with self.subTest(position=position):
+                response = self.client.get('/api/books/', {'cursor': self.cursor(position)})
+                self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get('/api/books/', {'cursor': 'garbage'}).status_code, 404)
+
+
+class BulkRatingTests(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email='owner@example.com', name='owner', password='Passw0rdX')
+        self.reader = User.objects.create_user(email='reader@example.com', name='reader', password='Passw0rdX')
+        self.books = Book.objects.bulk_create([
+            Book(user=owner, title=f'Book {index}', description='Description',
+                 cover='medias/book/covers/cover.jpg', book='medias/book/books/book.pdf')
+            for index in range(12)
+        ])
+        self.client.force_authenticate(self.reader)
+
+    def rate(self, ratings):
+        payload = {'ratings': [{'book': str(book.pk), 'rating': value} for book, value in ratings]}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/books/ratings/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_aggregates_follow_inserts_and_changes(self):
+        first, second = self.books[:2]
+        Rating.objects.create(user=self.reader, book=first, rating=2)
+        Book.objects.filter(pk=first.pk).update(rating_sum=2, rating_count=1, rating_2=1, rating_avg=2.0)
+
+        self.rate([(first, 5), (second, 4)])
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.rating_sum, first.rating_count, first.rating_avg), (5, 1, 5.0))
+        self.assertEqual(first.rating_histogram, {5: 1, 4: 0, 3: 0, 2: 0, 1: 0})
+        self.assertEqual((second.rating_sum, second.rating_count, second.rating_4), (4, 1, 1))
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        small = self.rate([(book, 3) for book in self.books[:2]])
+        large = self.rate([(book, 4) for book in self.books[2:]])
+        self.assertEqual(small, large)
+
+
+class SimilarityQueueTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email='owner@example.com', name='owner', password='Passw0rdX')
+        self.readers = [
+            User.objects.create_user(email=f'reader{index}@example.com', name='reader', password='Passw0rdX')
+            for index in range(2)
+        ]
+        self.books = Book.objects.bulk_create([
+            Book(user=owner, title=f'Book {index}', description='Description',
+                 cover='medias/book/covers/cover.jpg', book='medias/book/books/book.pdf')
+            for index in range(2)
+        ])
+
+    def rate_everything(self):
+        for reader in self.readers:
+            upsert_ratings(reader, {book.pk: 4 for book in self.books})
+
+    def test_ratings_mark_books_until_refreshed(self):
+        self.rate_everything()
+        self.assertEqual(StaleSimilarity.objects.count(), 2)
+
+        self.assertEqual(refresh_stale(), (2, 0))
+
+        self.assertFalse(StaleSimilarity.objects.exists())
+        first, second = self.books
+        self.assertTrue(SimilarBook.objects.filter(book=first, similar_book=second).exists())
+
+    def test_failed_refresh_stays_queued(self):
+        self.rate_everything()
+        with mock.patch('api.books.similarity.refresh_book', side_effect=OperationalError('database table is locked')):
+            self.assertEqual(refresh_stale(), (0, 2))
+        self.assertEqual(StaleSimilarity.objects.count(), 2)
+        self.assertEqual(refresh_stale(), (2, 0))
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email='owner@example.com', name='owner', password='Passw0rdX')
+        self.titled = Book.objects.create(user=owner, title='Garden river', description='Description',
+                                          cover='medias/book/covers/cover.jpg', book='medias/book/books/book.pdf')
+        self.described = [
+            Book.objects.create(user=owner, title=f'Book {index}', description='A garden', is_private=index % 2 == 1,
+                                cover='medias/book/covers/cover.jpg', book='medias/book/books/book.pdf')
+            for index in range(6)
+        ]
+
+    def search(self, terms):
+        seen = []
+        url = f'/api/books/?search={terms}&page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [book['id'] for book in response.data['results']]
+            url = response.data['next']
+        return seen
+
+    def test_pages_through_visible_matches_by_rank(self):
+        public = [str(book.pk) for book in self.described if not book.is_private]
+        seen = self.search('garden')
+        self.assertEqual(seen[0], str(self.titled.pk))
+        self.assertEqual(sorted(seen[1:]), sorted(public))
+
+    def test_no_match(self):
+        self.assertEqual(self.search('ocean'), [])
+
+
+class RetrieveViewCountTests(APITestCase):
+    def tearDown(self):
+        # Write buffered views while the test database still exists.
+        view_counter.flush()
+
+    def setUp(self):
+        owner = User.objects.create_user(email='owner@example.com', name='owner', password='Passw0rdX')
+        self.book = Book.objects.create(user=owner, title='Title', description='Description',
+                                        cover='medias/book/covers/cover.jpg', book='medias/book/books/book.pdf')
+        self.private = Book.objects.create(user=owner, title='Hidden', description='Description', is_private=True,
+                                           cover='medias/book/covers/cover.jpg', book='medias/book/books/book.pdf')
+
+    def test_full_and_not_modified_responses_count_as_views(self):
+        before = view_counter.pending(self.book.pk)
+        response = self.client.get(f'/api/books/{self.book.pk}/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(f'/api/books/{self.book.pk}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(view_counter.pending(self.book.pk) - before, 2)
+
+    def test_hidden_books_do_not_count(self):
+        self.assertEqual(self.client.get(f'/api/books/{self.private.pk}/').status_code, 404)
+        self.assertEqual(view_counter.pending(self.private.pk), 0)
+
+    def test_a_flush_in_progress_is_not_counted_twice(self):
+        for _ in range(3):
+            view_counter.hit(self.book.pk)
+        seen = []
+
+        def record_views(batch):
+            # The UPDATE has run but the batch is not yet committed.
+            seen.append(Book.objects.get(pk=self.book.pk).view_count + view_counter.pending(self.book.pk))
+
+        with mock.patch('api.books.counters.record_views', side_effect=record_views):
+            view_counter.flush()
+        self.assertEqual(seen, [3])
+
+    def test_list_and_detail_show_the_same_count(self):
+        view_counter.hit(self.book.pk)
+        listed = self.client.get('/api/books/').data['results']
+        # The detail request counts its own view after rendering.
+        detail = self.client.get(f'/api/books/{self.book.pk}/').data
+        self.assertEqual(detail['view_count'], 1)
+        self.assertEqual([book['view_count'] for book in listed], [1])
+
+    def test_unknown_ids_leave_no_version_stamps(self):
+        book_id = uuid.uuid4()
+        etag = make_etag(book_scope(book_id), 0)
+        self.assertEqual(self.client.get(f'/api/books/{book_id}/', HTTP_IF_NONE_MATCH=etag).status_code, 404)
+        self.assertEqual(self.client.get(f'/api/books/{book_id}/comments/').status_code, 404)
+        for scope in (book_scope(book_id), comments_scope(book_id)):
+            self.assertIsNone(response_cache.versions.get(f'version:{scope}'))
+
+
+class UploadFinalizeTests(MediaRootMixin, APITestCase):
+    content = b'%PDF-1.4 resumable'
+
+    def setUp(self):
+        media_root = self.use_temporary_media_root()
+        override = override_settings(BOOK_UPLOAD_DIR=os.path.join(media_root, 'uploads'), BACKGROUND_TASKS_EAGER=True)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(email='owner@example.com', name='owner', password='Passw0rdX')
+        self.client.force_authenticate(self.user)
+        self.upload = BookUpload.objects.create(user=self.user, filename='book.pdf', size=len(self.content),
+                                                checksum=hashlib.sha256(self.content).hexdigest())
+        with open(part_path(self.upload), 'wb') as handle:
+            handle.write(self.content)
+
+    def finalize(self):
+        image = io.BytesIO()
+        Image.new('RGB', (4, 4)).save(image, 'JPEG')
+        cover = SimpleUploadedFile('cover.jpg', image.getvalue(), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/api/books/uploads/{self.upload.pk}/finalize/', {
+                'title': 'Title', 'description': 'Description', 'book_author': 'Author', 'is_private': True,
+                'cover': cover,
+            }, format='multipart')
+
+    def test_repeated_finalize_returns_the_same_book(self):
+        first = self.finalize()
+        self.assertEqual(first.status_code, 201)
+        self.assertFalse(os.path.exists(part_path(self.upload)))
+
+        second = self.finalize()
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(Book.objects.count(), 1)
+
+    def test_finalize_in_progress_elsewhere_conflicts(self):
+        self.assertTrue(claim(self.upload))
+        self.assertEqual(self.finalize().status_code, 409)
+        self.assertFalse(Book.objects.exists())
+
+    def test_upload_stays_resumable_when_the_book_is_not_saved(self):
+        def fail(**kwargs):
+            raise OperationalError('database is locked')
+
+        post_save.connect(fail, sender=Book, dispatch_uid='fail-finalize')
+        try:
+            with self.assertRaises(OperationalError):
+                self.finalize()
+        finally:
+            post_save.disconnect(sender=Book, dispatch_uid='fail-finalize')
+        self.assertFalse(Book.objects.exists())
+
+        response = self.finalize()
+        self.assertEqual(response.status_code, 201)
+        with Book.objects.get().book.open('rb') as handle:
+            self.assertEqual(handle.read(), self.content)
+
+
+class InlineExecutor:
+    """Runs importer copies on the test thread, which owns the test database connection."""
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    def shutdown(self):
+        pass
+
+
+class ImporterTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        self.use_temporary_media_root()
+        self.files = tempfile.TemporaryDirectory()
+        self.addCleanup(self.files.cleanup)
+        with open(os.path.join(self.files.name, 'book.pdf'), 'wb') as handle:
+            handle.write(b'%PDF-1.4 imported')
+        self.user = User.objects.create_user(email='owner@example.com', name='owner', password='Passw0rdX')
+        self.row = {'id': 'first', 'title': 'Title', 'description': 'Description', 'book': 'book.pdf',
+                    'is_private': 'true'}
+
+    def importer(self):
+        importer = BookImporter(self.files.name, owners=lambda owner: self.user.pk)
+        importer.executor.shutdown()
+        importer.executor = InlineExecutor()
+        return importer
+
+    def test_rerun_keeps_one_reference(self):
+        self.assertEqual(self.importer().run([(1, self.row)]).imported, 1)
+        stats = self.importer().run([(1, self.row)])
+        self.assertEqual((stats.imported, stats.skipped), (0, 1))
+        book = Book.objects.get()
+        self.assertEqual(StoredBlob.objects.get(name=book.book.name).refcount, 1)
+
+    def test_rows_inserted_elsewhere_release_their_files(self):
+        importer = self.importer()
+        copy = importer.copy
+
+        def copy_then_lose_the_race(job):
+            copied = copy(job)
+            Book.objects.create(id=job[0].pk, user=self.user, title='Title', description='Description',
+                                is_private=True, cover='medias/book/covers/cover.jpg', book='medias/book/books/other.pdf')
+            return copied
+
+        importer.copy = copy_then_lose_the_race
+        stats = importer.run([(1, self.row)])
+
+        self.assertEqual((stats.imported, stats.skipped), (0, 1))
+        self.assertEqual(list(StoredBlob.objects.values_list('refcount', flat=True)), [0])
+
+
+def jpeg(colour='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 60), colour).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class CoverVariantTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        self.use_temporary_media_root()
+        self.user = User.objects.create_user(email='owner@example.com', name='owner', password='Passw0rdX')
+        self.book = Book.objects.create(user=self.user, title='Title', description='Description', is_private=True,
+                                        cover=ContentFile(jpeg(), name='cover.jpg'),
+                                        book=ContentFile(b'%PDF-1.4', name='book.pdf'))
+
+    def variant_names(self, variants):
+        return [path for name in ('thumb', 'medium') for path in variants[name].values()]
+
+    def refcounts(self, names):
+        return [StoredBlob.objects.get(name=name).refcount for name in names]
+
+    def test_new_cover_replaces_variants_and_releases_the_old_ones(self):
+        old = self.variant_names(generate_cover_variants(self.book.pk))
+        self.assertEqual(self.refcounts(old), [1] * len(old))
+
+        self.book.refresh_from_db()
+        self.book.cover = ContentFile(jpeg('blue'), name='cover.jpg')
+        self.book.save()
+        new = generate_cover_variants(self.book.pk)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.cover_variants, new)
+        self.assertEqual(new['source'], self.book.cover.name)
+        self.assertEqual(self.refcounts(old), [0] * len(old))
+        self.assertEqual(self.refcounts(self.variant_names(new)), [1] * len(old))
+
+    def test_undecodable_cover_is_recorded_without_variants(self):
+        old = self.variant_names(generate_cover_variants(self.book.pk))
+        self.book.refresh_from_db()
+        self.book.cover = ContentFile(b'not an image', name='cover.jpg')
+        self.book.save()
+
+        self.assertIsNone(generate_cover_variants(self.book.pk))
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.cover_variants, {'source': self.book.cover.name})
+        self.assertEqual(self.refcounts(old), [0] * len(old))
+
+    def test_only_a_new_cover_schedules_variants(self):
+        self.client.force_authenticate(self.user)
+        url = f'/api/books/my-books/{self.book.pk}/'
+        with mock.patch('api.books.views.schedule_cover_variants') as schedule:
+            self.assertEqual(self.client.patch(url, {'title': 'Renamed'}, format='multipart').status_code, 200)
+            schedule.assert_not_called()
+            cover = SimpleUploadedFile('cover.jpg', jpeg('green'), content_type='image/jpeg')
+            self.assertEqual(self.client.patch(url, {'cover': cover}, format='multipart').status_code, 200)
+            schedule.assert_called_once_with(self.book.pk)
@@ -0,0 +1,51 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.urls import reverse
+
+from .models import Comment
+from .pagination import KeysetPagination
+
+ROOT_ORDERING = ('-commented_at', '-id')
+REPLY_ORDERING = ('commented_at', 'id')
+REPLY_PREVIEW_SIZE = 3
+
+
+def replies_queryset():
+    return Comment.objects.select_related('user', 'child__user')
+
+
+def load_threads(roots, request, preview_size=REPLY_PREVIEW_SIZE):
+    """Attach the first replies, the reply count and a "load more" link to each root.
+
+    All replies of the page come from one query: a window function numbers
+    them per thread so only `preview_size` rows per root leave the database,
+    and a second window carries the full thread size alongside.
+    """
+    roots = list(roots)
+    if not roots:
+        return roots
+
+    replies = replies_queryset().filter(parent_id__in=[root.pk for root in roots]).annotate(
+        position=Window(RowNumber(), partition_by=[F('parent_id')],
+                        order_by=[F('commented_at').asc(), F('id').asc()]),
+        thread_size=Window(Count('id'), partition_by=[F('parent_id')]),
+    ).filter(position__lte=preview_size).order_by('parent_id', 'position')
+
+    grouped = defaultdict(list)
+    for reply in replies:
+        grouped[reply.parent_id].append(reply)
+
+    paginator = KeysetPagination()
+    for root in roots:
+        preview = grouped.get(root.pk, [])
+        root.preview_replies = preview
+        root.reply_total = preview[0].thread_size if preview else 0
+        root.replies_next = None
+        if root.reply_total > len(preview):
+            url = request.build_absolute_uri(
+                reverse('comments-replies', kwargs={'book_id': root.book_id, 'pk': root.pk})
+            )
+            root.replies_next = paginator.build_link(url, preview[-1], REPLY_ORDERING)
+    return roots
@@ -0,0 +1,136 @@
+import fcntl
+import hashlib
+import os
+import shutil
+from contextlib import contextmanager, suppress
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import BookUpload
+
+COPY_BUFFER = 64 * 1024
+# A finalize that crashed mid-way gives its claim up after this many seconds.
+CLAIM_LEASE = getattr(settings, 'BOOK_UPLOAD_CLAIM_LEASE', 600)
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, offset):
+        super().__init__(f'Upload is at offset {offset}')
+        self.offset = offset
+
+
+class PartFile(File):
+    """An assembled upload; FileSystemStorage moves it into place instead of copying."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def upload_dir():
+    path = getattr(settings, 'BOOK_UPLOAD_DIR', os.path.join(settings.BASE_DIR, 'uploads'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def part_path(upload):
+    return os.path.join(upload_dir(), f'{upload.pk.hex}.part')
+
+
+@contextmanager
+def locked_part(upload, mode='ab'):
+    """Open the partial file under an exclusive lock shared by every worker process."""
+    with open(part_path(upload), mode) as handle:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield handle
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def current_offset(upload):
+    try:
+        return os.path.getsize(part_path(upload))
+    except FileNotFoundError:
+        return 0
+
+
+def append_chunk(upload, offset, stream, length):
+    """Append `length` bytes from `stream` at `offset`; return the new offset.
+
+    The file size is the source of truth, so a dropped connection simply
+    leaves a shorter file and the client resumes from the reported offset.
+    """
+    with locked_part(upload) as handle:
+        handle.seek(0, os.SEEK_END)
+        position = handle.tell()
+        if position != offset:
+            raise OffsetMismatch(position)
+        remaining = min(length, upload.size - position)
+        while remaining > 0:
+            chunk = stream.read(min(COPY_BUFFER, remaining))
+            if not chunk:
+                break
+            handle.write(chunk)
+            remaining -= len(chunk)
+        handle.flush()
+        return handle.tell()
+
+
+def verify_part(upload):
+    """Return True when the assembled file has the declared size and SHA-256."""
+    try:
+        with locked_part(upload, 'rb') as handle:
+            digest = hashlib.sha256()
+            size = 0
+            for chunk in iter(lambda: handle.read(COPY_BUFFER), b''):
+                digest.update(chunk)
+                size += len(chunk)
+    except FileNotFoundError:
+        return False
+    return size == upload.size and digest.hexdigest() == upload.checksum.lower()
+
+
+def claim(upload):
+    """Reserve `upload` for one finalize request; False when another holds it or it is already a book."""
+    now = timezone.now()
+    free = Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - timedelta(seconds=CLAIM_LEASE))
+    return bool(BookUpload.objects.filter(free, pk=upload.pk, book__isnull=True).update(claimed_at=now))
+
+
+def release(upload):
+    BookUpload.objects.filter(pk=upload.pk, book__isnull=True).update(claimed_at=None)
+
+
+@contextmanager
+def finalizing_part(upload):
+    """Yield the assembled file as a PartFile under a second, hard-linked name.
+
+    Storage moves the file it is given; moving the link leaves the part in
+    place, so the upload can still be finalized again if the book is not
+    saved. The part itself is discarded once the book commits.
+    """
+    path = part_path(upload)
+    link = f'{path}.finalize'
+    with suppress(FileNotFoundError):
+        os.remove(link)
+    try:
+        os.link(path, link)
+    except OSError:
+        shutil.copyfile(path, link)
+    try:
+        with open(link, 'rb') as handle:
+            yield PartFile(handle, name=upload.filename)
+    finally:
+        with suppress(FileNotFoundError):
+            os.remove(link)
+
+
+def discard_part(upload):
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
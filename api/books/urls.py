@@ -1,13 +1,17 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BooksViewSet, CommentViewSet, RatingViewSet, MyBooksViewSet
+from .views import BooksViewSet, CommentViewSet, RatingViewSet, MyBooksViewSet, BookDownloadView, BookUploadViewSet, \
+    BulkRatingView
 
 router = DefaultRouter(root_renderers="pretty_json")
 router.register(r"my-books", MyBooksViewSet, basename="my-books")
+router.register(r"uploads", BookUploadViewSet, basename="book-uploads")
 router.register(r"(?P<book_id>[\w-]+)/comments", CommentViewSet, basename="comments")
 router.register(r"(?P<book_id>[\w-]+)/review", RatingViewSet, basename="review")
 router.register(r"", BooksViewSet, basename="books")
 
 urlpatterns = [
+    path("ratings/bulk/", BulkRatingView.as_view(), name="ratings-bulk"),
+    path("<uuid:pk>/download/", BookDownloadView.as_view(), name="book-download"),
     path("", include(router.urls), name="books"),
 ]
@@ -1,15 +1,36 @@
-from django.db.models import Avg
-from rest_framework import viewsets, status, mixins, exceptions, filters
-from rest_framework.decorators import api_view
+import os
+import posixpath
+import time
+import uuid
+
+from rest_framework import viewsets, status, mixins, exceptions
+from rest_framework.decorators import action, api_view
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from api.books.models import Book, Comment, Rating
+from api.conditional import conditional_response, make_etag
+from api.books.models import Book, BookUpload, Comment, Rating, SimilarBook
 from api.books.serializers import BookSerializer, BookViewSerializer, \
-    CommentSerializer, RatingSerializer, CommentChildSerializer
+    CommentSerializer, RatingSerializer, CommentChildSerializer, BookUploadSerializer, BulkRatingSerializer, \
+    SimilarBookSerializer
 from .permissions import IsOwnerOrReadOnly
-from django.db import models
+from .cache import CATALOGUE, LIST_TIMEOUT, book_scope, comments_scope, response_cache
+from .counters import view_counter
+from .images import schedule_cover_variants
+from .pagination import KeysetPagination
+from .search import BookSearchFilter
+from .streaming import ranged_file_response
+from .uploads import OffsetMismatch, append_chunk, claim, current_offset, \
+    discard_part, finalizing_part, part_path, release, verify_part
+from .threads import REPLY_ORDERING, ROOT_ORDERING, load_threads, replies_queryset
+from .ratings import apply_rating_change, lock_books, upsert_ratings
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import Http404
 
 
 class MyBooksViewSet(mixins.CreateModelMixin,
@@ -32,44 +53,218 @@ class MyBooksViewSet(mixins.CreateModelMixin,
             return [IsAuthenticated(), IsOwnerOrReadOnly()]
         return [IsAuthenticated()]
 
+    def perform_create(self, serializer):
+        book = serializer.save()
+        schedule_cover_variants(book.pk)
+
+    def perform_update(self, serializer):
+        book = serializer.save()
+        if 'cover' in serializer.validated_data:
+            schedule_cover_variants(book.pk)
+
     def list(self, request, *args, **kwargs):
         queryset = Book.objects.filter(user=request.user).all()
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
 
+class BookUploadViewSet(mixins.CreateModelMixin,
+                        mixins.RetrieveModelMixin,
+                        mixins.DestroyModelMixin,
+                        viewsets.GenericViewSet):
+    serializer_class = BookUploadSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'head', 'post', 'patch', 'delete']
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return BookUpload.objects.none()
+        return BookUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        upload = serializer.save(user=self.request.user)
+        open(part_path(upload), 'wb').close()
+
+    def partial_update(self, request, *args, **kwargs):
+        upload = self.get_object()
+        if upload.book_id is not None:
+            return Response({"detail": "Upload is already finalized"}, status=status.HTTP_409_CONFLICT)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return Response({"detail": "Upload-Offset and Content-Length headers are required"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if length > settings.BOOK_UPLOAD_MAX_CHUNK:
+            return Response({"detail": f"Chunks are limited to {settings.BOOK_UPLOAD_MAX_CHUNK} bytes"},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            offset = append_chunk(upload, offset, request.stream, length)
+        except OffsetMismatch as e:
+            return Response({"detail": str(e), "offset": e.offset}, status=status.HTTP_409_CONFLICT,
+                            headers={'Upload-Offset': str(e.offset)})
+        return Response({"offset": offset}, headers={'Upload-Offset': str(offset)})
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, *args, **kwargs):
+        upload = self.get_object()
+        if upload.book_id is not None:
+            return self.finalized_response(upload)
+        if not claim(upload):
+            upload.refresh_from_db()
+            if upload.book_id is not None:
+                return self.finalized_response(upload)
+            return Response({"detail": "Upload is already being finalized"}, status=status.HTTP_409_CONFLICT)
+        if not verify_part(upload):
+            release(upload)
+            return Response({"detail": "Size or checksum mismatch", "offset": current_offset(upload)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        data = {key: request.data.get(key) for key in request.data}
+        try:
+            with transaction.atomic(), finalizing_part(upload) as part:
+                data['book'] = part
+                serializer = BookSerializer(data=data, context=self.get_serializer_context())
+                serializer.is_valid(raise_exception=True)
+                book = serializer.save()
+                BookUpload.objects.filter(pk=upload.pk).update(book=book)
+                transaction.on_commit(lambda: discard_part(upload))
+        except BaseException:
+            # The part is untouched, so the client can fix the request and finalize again.
+            release(upload)
+            raise
+        schedule_cover_variants(book.pk)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def finalized_response(self, upload):
+        serializer = BookSerializer(upload.book, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    def perform_destroy(self, instance):
+        discard_part(instance)
+        instance.delete()
+
+
 class BooksViewSet(mixins.ListModelMixin,
                    mixins.RetrieveModelMixin,
                    viewsets.GenericViewSet):
     serializer_class = BookSerializer
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title', 'book_author']
+    filter_backends = [BookSearchFilter]
+    pagination_class = KeysetPagination
+    sort_orderings = {
+        'date': ('-uploaded_at', '-id'),
+        'views': ('-view_count', '-id'),
+        'rating': ('-rating_avg', '-id'),
+        'top': ('-ranking__bayes_score', '-ranking__book_id'),
+        'trending': ('-ranking__trending_score', '-ranking__book_id'),
+    }
 
     def get_queryset(self):
-        queryset = Book.objects.filter(is_private=False)
-        sort_by = self.request.query_params.get('sort_by', None)
-        if sort_by == 'date':
-            queryset = queryset.order_by('-uploaded_at')
-        elif sort_by == 'views':
-            queryset = queryset.order_by('-view_count')
-        elif sort_by == 'rating':
-            queryset = queryset.annotate(avg_rating=Avg('ratings_book__rating')).order_by('-avg_rating')
+        # `is_private=False` compiles to `NOT is_private`, which SQLite cannot
+        # seek on; the IN form keeps the composite catalogue indexes usable.
+        queryset = Book.objects.filter(is_private__in=[False])
+        if self.request.query_params.get('sort_by') in ('top', 'trending'):
+            # Leaderboards walk the BookRanking indexes and join the books in.
+            queryset = queryset.filter(ranking__is_private__in=[False]).select_related('ranking')
         return queryset
 
+    def get_cursor_ordering(self):
+        sort_by = self.request.query_params.get('sort_by')
+        if sort_by is None and BookSearchFilter().get_search_terms(self.request):
+            return ('-search_rank', '-id')
+        return self.sort_orderings.get(sort_by, self.sort_orderings['date'])
+
     def get_serializer_class(self):
         if self.action == 'list':
             return BookViewSerializer
         return self.serializer_class
 
+    def list(self, request, *args, **kwargs):
+        etag = make_etag(response_cache.version(CATALOGUE), request.query_params.urlencode(),
+                         int(time.time() // LIST_TIMEOUT))
+        return conditional_response(request, lambda: response_cache.respond(
+            request, 'books.list', [CATALOGUE],
+            lambda: super(BooksViewSet, self).list(request, *args, **kwargs),
+            timeout=LIST_TIMEOUT,
+        ), etag=etag)
+
     def retrieve(self, request, *args, **kwargs):
+        try:
+            book_id = uuid.UUID(kwargs['pk'])
+        except ValueError:
+            raise exceptions.NotFound()
+        # Unknown and private ids get no ETag, so they can never be answered with a 304.
+        if not self.get_queryset().filter(pk=book_id).exists():
+            raise exceptions.NotFound()
+        scope = book_scope(book_id)
+        # Like catalogue pages, the detail embeds an approximate view count
+        # that no version bump tracks, so it is rebuilt every LIST_TIMEOUT.
+        etag = make_etag(scope, response_cache.version(scope), int(time.time() // LIST_TIMEOUT))
+        response = conditional_response(request, lambda: response_cache.respond(
+            request, 'books.retrieve', [scope], lambda: self.build_retrieve(request), timeout=LIST_TIMEOUT,
+        ), etag=etag)
+        # Missing and private books answer 404 and must not count as views;
+        # a 304 does, since the client shows the book from its own copy.
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            view_counter.hit(book_id)
+        return response
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, *args, **kwargs):
+        try:
+            book_id = uuid.UUID(kwargs['pk'])
+        except ValueError:
+            raise exceptions.NotFound()
+        neighbours = SimilarBook.objects.filter(
+            book_id=book_id, book__is_private__in=[False], similar_book__is_private__in=[False],
+        ).select_related('similar_book').order_by('rank')
+        serializer = SimilarBookSerializer(neighbours, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    def build_retrieve(self, request):
         instance = self.get_object()
-        instance.view_count = models.F('view_count') + 1
-        instance.save(update_fields=['view_count'])
-        instance.refresh_from_db()
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
 
+class BookDownloadView(APIView):
+    permission_classes = []
+
+    def get(self, request, pk):
+        book = get_object_or_404(Book, pk=pk)
+        if book.is_private and book.user_id != request.user.pk:
+            raise exceptions.NotFound()
+        fieldfile = book.cover if request.query_params.get('file') == 'cover' else book.book
+        if not fieldfile:
+            raise exceptions.NotFound()
+        return ranged_file_response(request._request, fieldfile.storage, fieldfile.name,
+                                    as_attachment=request.query_params.get('download') == '1')
+
+
+def media_name(path):
+    """Normalize a media URL path to a storage name, or return None for paths that could alias another name."""
+    segments = path.split('/')
+    if path.startswith('/') or '..' in segments or '' in segments:
+        return None
+    return posixpath.normpath(path)
+
+
+def serve_media(request, path):
+    # Book files are only reachable through BookDownloadView, which checks is_private.
+    name = media_name(path)
+    books_dir = Book._meta.get_field('book').upload_to
+    if name is None or name.startswith(books_dir):
+        raise Http404()
+    try:
+        exists = default_storage.exists(name)
+        resolved = os.path.realpath(default_storage.path(name))
+    except SuspiciousFileOperation:
+        raise Http404()
+    if not exists or resolved.startswith(os.path.realpath(default_storage.path(books_dir)) + os.sep):
+        raise Http404()
+    return ranged_file_response(request, default_storage, name)
+
+
 class CommentViewSet(mixins.CreateModelMixin,
                      mixins.UpdateModelMixin,
                      mixins.DestroyModelMixin,
@@ -77,15 +272,32 @@ class CommentViewSet(mixins.CreateModelMixin,
                      viewsets.GenericViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    pagination_class = KeysetPagination
     http_method_names = ['get', 'post', 'put', 'delete']
 
+    def get_cursor_ordering(self):
+        if self.action == 'replies':
+            return REPLY_ORDERING
+        return ROOT_ORDERING
+
     def list(self, request, *args, **kwargs):
-        book = Book.objects.get(pk=self.kwargs['book_id'])
-        queryset = Comment.objects.filter(parent=None, book=book).order_by('-commented_at')
-        serializer = CommentSerializer(queryset, many=True)
-        data = serializer.data
+        book = get_object_or_404(Book, pk=self.kwargs['book_id'])
+        scope = comments_scope(book.pk)
+        etag = make_etag(scope, response_cache.version(scope), request.query_params.urlencode())
+        return conditional_response(request, lambda: self.build_list(request, book), etag=etag)
+
+    def build_list(self, request, book):
+        queryset = Comment.objects.filter(parent=None, book=book).select_related('user')
+        page = load_threads(self.paginate_queryset(queryset), request)
+        serializer = CommentSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-        return Response(data, status=status.HTTP_200_OK)
+    @action(detail=True, methods=['get'])
+    def replies(self, request, *args, **kwargs):
+        queryset = replies_queryset().filter(parent_id=self.kwargs['pk'], book_id=self.kwargs['book_id'])
+        page = self.paginate_queryset(queryset)
+        serializer = CommentChildSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def perform_create(self, serializer):
         try:
@@ -114,24 +326,46 @@ class RatingViewSet(mixins.CreateModelMixin, mixins.DestroyModelMixin, viewsets.
     serializer_class = RatingSerializer
     permission_classes = [IsAuthenticated]
 
-    def perform_create(self, serializer):
-        try:
-            book = get_object_or_404(Book, pk=self.kwargs['book_id'])
-            if book.user == self.request.user:
-                print(5)
-                return Response({"detail": "You cannot rate your own book"}, status=status.HTTP_403_FORBIDDEN)
-            rating = Rating.objects.filter(book=book, user=self.request.user).first()
-            if rating:
-                rating.delete()
-            serializer.save(user=self.request.user, book=book)
-        except Book.DoesNotExist:
-            return Response({"detail": "Book not found"}, status=status.HTTP_404_NOT_FOUND)
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            book = get_object_or_404(Book.objects.select_for_update().only('id', 'user_id'), pk=self.kwargs['book_id'])
+            if book.user_id == request.user.pk:
+                raise exceptions.PermissionDenied('You cannot rate your own book')
+            rating = upsert_ratings(request.user, {book.pk: serializer.validated_data['rating']})[0]
+        return Response(self.get_serializer(rating).data, status=status.HTTP_201_CREATED)
 
     def destroy(self, request, *args, **kwargs):
         try:
-            book = get_object_or_404(Book, pk=self.kwargs['book_id'])
-            rating = Rating.objects.get(book=book, user=self.request.user)
-            rating.delete()
+            with transaction.atomic():
+                book = get_object_or_404(Book.objects.select_for_update().only('id'), pk=self.kwargs['book_id'])
+                rating = Rating.objects.get(book=book, user=self.request.user)
+                rating.delete()
+                apply_rating_change(book.pk, old=rating.rating)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Rating.DoesNotExist:
             return Response({"detail": "No review found"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class BulkRatingView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkRatingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # A book listed twice keeps its last rating.
+        ratings = {item['book']: item['rating'] for item in serializer.validated_data['ratings']}
+        with transaction.atomic():
+            owners = lock_books(ratings)
+            missing = [str(book_id) for book_id in ratings if book_id not in owners]
+            own = [str(book_id) for book_id, owner in owners.items() if owner == request.user.pk]
+            if missing or own:
+                errors = {}
+                if missing:
+                    errors['missing'] = missing
+                if own:
+                    errors['own_books'] = own
+                raise exceptions.ValidationError(errors)
+            rows = upsert_ratings(request.user, ratings)
+        return Response(RatingSerializer(rows, many=True).data, status=status.HTTP_200_OK)
@@ -0,0 +1,27 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+
+def make_etag(*parts):
+    raw = '|'.join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+
+def conditional_response(request, build, etag):
+    """Answer If-None-Match before calling `build`.
+
+    `etag` must come from something cheaper than the response itself
+    (version stamps, aggregates); `build` only runs when the client's copy
+    is stale. No Last-Modified is sent: a max(updated_at) has one-second
+    resolution and does not move when a row is deleted, so
+    If-Modified-Since could answer 304 for a list that changed.
+    """
+    django_request = getattr(request, '_request', request)
+    response = get_conditional_response(django_request, etag=etag)
+    if response is None:
+        response = build()
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+    return response
@@ -0,0 +1,146 @@
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Subquery
+from django.utils import timezone
+
+from api.books.models import Book
+from api.books.tasks import CoalescedTask
+from .models import FeedBroadcaster, FeedEntry, FeedEvent, Friend
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'NETWORK_FEED', {})
+FANOUT_LIMIT = _config.get('FANOUT_LIMIT', 1000)
+MAX_ENTRIES = _config.get('MAX_ENTRIES', 500)
+TRIM_PROBABILITY = _config.get('TRIM_PROBABILITY', 0.05)
+BATCH_SIZE = _config.get('BATCH_SIZE', 100)
+MAX_ATTEMPTS = _config.get('MAX_ATTEMPTS', 8)
+BACKOFF_BASE = _config.get('BACKOFF_BASE', 5)
+BACKOFF_MAX = _config.get('BACKOFF_MAX', 600)
+LEASE = _config.get('LEASE', 300)
+FEED_ORDERING = ('-created_at', '-id')
+
+
+
+def friends_of(user_id, limit=None):
+    """Friend ids of `user_id`; a Friend row links both users whichever side accepted."""
+    ids = Friend.objects.filter(user_id=user_id).values_list('friend_user_id', flat=True).union(
+        Friend.objects.filter(friend_user_id=user_id).values_list('user_id', flat=True)
+    )
+    return list(ids[:limit] if limit is not None else ids)
+
+
+def publish(actor_id, verb, book_id, comment_id=None, rating=None, created_at=None):
+    """Write an activity into every friend's timeline, or once as a broadcast for very connected actors."""
+    if not Book.objects.filter(pk=book_id, is_private__in=[False]).exists():
+        return 0
+    entry = dict(actor_id=actor_id, verb=verb, book_id=book_id, comment_id=comment_id, rating=rating,
+                 created_at=created_at or timezone.now())
+    friends = friends_of(actor_id, limit=FANOUT_LIMIT + 1)
+    if len(friends) > FANOUT_LIMIT:
+        FeedBroadcaster.objects.get_or_create(user_id=actor_id)
+        FeedEntry.objects.create(owner=None, **entry)
+        if random.random() < TRIM_PROBABILITY:
+            trim(Q(owner__isnull=True, actor_id=actor_id))
+        return 1
+
+    FeedEntry.objects.bulk_create([FeedEntry(owner_id=friend_id, **entry) for friend_id in friends])
+    for friend_id in friends:
+        # Trimming a sample per event keeps timelines near the cap at a fraction of the cost.
+        if random.random() < TRIM_PROBABILITY:
+            trim(Q(owner_id=friend_id))
+    return len(friends)
+
+
+def queue_events(events):
+    """Record `(actor_id, verb, book_id, comment_id, rating)` activities in the current transaction.
+
+    The rows commit or roll back with the change they describe; fan-out
+    happens afterwards in deliver_pending, which retries failures with
+    backoff, so a locked database or a crashed worker only delays entries.
+    """
+    FeedEvent.objects.bulk_create([
+        FeedEvent(actor_id=actor_id, verb=verb, book_id=book_id, comment_id=comment_id, rating=rating)
+        for actor_id, verb, book_id, comment_id, rating in events
+    ])
+    _drain_task.schedule()
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def claim(batch_size=BATCH_SIZE):
+    """Lease up to `batch_size` due events to this worker by pushing their next attempt past the lease.
+
+    The lease is taken by one conditional UPDATE rather than a locking read,
+    which SQLite would have to upgrade mid-transaction and could refuse. The
+    exact lease timestamp then tells this worker's rows from a concurrent one's.
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=LEASE)
+    due = FeedEvent.objects.filter(next_attempt_at__lte=now)
+    ids = list(due.order_by('next_attempt_at', 'id').values_list('pk', flat=True)[:batch_size])
+    if not ids or not due.filter(pk__in=ids).update(next_attempt_at=lease):
+        return []
+    return list(FeedEvent.objects.filter(pk__in=ids, next_attempt_at=lease).order_by('id'))
+
+
+def deliver_pending(batch_size=BATCH_SIZE):
+    """Fan out one claimed batch; returns (delivered, retried, failed)."""
+    delivered = retried = failed = 0
+    for event in claim(batch_size):
+        try:
+            with transaction.atomic():
+                publish(event.actor_id, event.verb, event.book_id, comment_id=event.comment_id, rating=event.rating,
+                        created_at=event.created_at)
+                event.delete()
+        except Exception as exc:
+            event.attempts += 1
+            event.last_error = f'{type(exc).__name__}: {exc}'[:2000]
+            if event.attempts >= MAX_ATTEMPTS:
+                logger.error('Giving up on feed event %s of %s: %s', event.pk, event.actor_id, event.last_error)
+                FeedEvent.objects.filter(pk=event.pk).delete()
+                failed += 1
+            else:
+                event.next_attempt_at = timezone.now() + timedelta(seconds=backoff(event.attempts))
+                event.save(update_fields=['attempts', 'last_error', 'next_attempt_at'])
+                retried += 1
+        else:
+            delivered += 1
+    return delivered, retried, failed
+
+
+def drain():
+    # Whatever a drain misses or fails is left for the next one or for the publish_feed_events worker.
+    while any(deliver_pending()):
+        pass
+
+
+_drain_task = CoalescedTask(drain)
+
+
+def trim(timeline, keep=MAX_ENTRIES):
+    cutoff = FeedEntry.objects.filter(timeline).order_by(*FEED_ORDERING).values('created_at')[keep - 1:keep]
+    return FeedEntry.objects.filter(timeline, created_at__lt=Subquery(cutoff)).delete()[0]
+
+
+def feed_queryset(user):
+    """Own timeline rows plus broadcast rows of friends who are broadcasters."""
+    broadcasters = list(FeedBroadcaster.objects.filter(
+        Q(user_id__in=Friend.objects.filter(user=user).values('friend_user'))
+        | Q(user_id__in=Friend.objects.filter(friend_user=user).values('user'))
+    ).values_list('user_id', flat=True))
+    condition = Q(owner=user)
+    if broadcasters:
+        condition |= Q(owner__isnull=True, actor_id__in=broadcasters)
+    return FeedEntry.objects.filter(condition, book__is_private__in=[False]) \
+        .select_related('actor', 'book', 'comment')
+
+
+def forget_friendship(user_id, friend_id):
+    FeedEntry.objects.filter(Q(owner_id=user_id, actor_id=friend_id) | Q(owner_id=friend_id, actor_id=user_id)).delete()
@@ -0,0 +1,141 @@
+import heapq
+import threading
+import time
+from array import array
+from collections import Counter
+from datetime import timedelta
+from itertools import chain, islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Friend
+
+_config = getattr(settings, 'NETWORK_GRAPH', {})
+MAX_SUGGESTIONS = _config.get('MAX_SUGGESTIONS', 50)
+
+
+class FriendGraph:
+    """Per-process undirected friendship graph for friend-of-friend suggestions.
+
+    Users are mapped to dense ints and each adjacency list is an int array,
+    so a million edges take a few megabytes. Mutual-friend counts for every
+    two-hop candidate come from one Counter pass over the friends' arrays,
+    which runs in C. Friend signals apply this process's own changes at
+    once; rows written by other workers are pulled every SYNC_INTERVAL and
+    deletions they made are picked up by the REBUILD_INTERVAL rebuild.
+    """
+
+    def __init__(self, sync_interval=30, rebuild_interval=600, max_scan=2000):
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.max_scan = max_scan
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._ids = {}
+        self._users = []
+        self._adjacency = []
+        self._watermark = None
+        self._built_at = None
+        self._synced_at = 0.0
+
+    def _index(self, user_id):
+        index = self._ids.get(user_id)
+        if index is None:
+            index = len(self._users)
+            self._ids[user_id] = index
+            self._users.append(user_id)
+            self._adjacency.append(array('l'))
+        return index
+
+    def _link(self, user_id, friend_id):
+        if user_id == friend_id:
+            return
+        first, second = self._index(user_id), self._index(friend_id)
+        if second not in self._adjacency[first]:
+            self._adjacency[first].append(second)
+            self._adjacency[second].append(first)
+
+    def add(self, user_id, friend_id):
+        with self._lock:
+            if self._built_at is not None:
+                self._link(user_id, friend_id)
+
+    def remove(self, user_id, friend_id):
+        with self._lock:
+            first, second = self._ids.get(user_id), self._ids.get(friend_id)
+            if first is None or second is None:
+                return
+            for node, other in ((first, second), (second, first)):
+                try:
+                    self._adjacency[node].remove(other)
+                except ValueError:
+                    pass
+
+    def refresh(self):
+        now = time.monotonic()
+        if self._built_at is not None and now - self._synced_at < self.sync_interval:
+            return
+        # Only the first build makes readers wait; later refreshes serve the current graph meanwhile.
+        if not self._refresh_lock.acquire(blocking=self._built_at is None):
+            return
+        try:
+            if self._built_at is None or now - self._built_at >= self.rebuild_interval:
+                self.rebuild()
+            elif now - self._synced_at >= self.sync_interval:
+                self.pull()
+        finally:
+            self._refresh_lock.release()
+
+    def rebuild(self):
+        # Overlap the watermark so rows committed late with an earlier created_at are still pulled.
+        watermark = timezone.now() - timedelta(seconds=self.sync_interval)
+        graph = FriendGraph()
+        for user_id, friend_id in Friend.objects.values_list('user_id', 'friend_user_id').iterator(chunk_size=10000):
+            if user_id != friend_id:
+                first, second = graph._index(user_id), graph._index(friend_id)
+                graph._adjacency[first].append(second)
+                graph._adjacency[second].append(first)
+        # Pairs stored in both directions would count twice.
+        adjacency = [array('l', set(neighbours)) for neighbours in graph._adjacency]
+        with self._lock:
+            self._ids, self._users, self._adjacency = graph._ids, graph._users, adjacency
+            self._watermark = watermark
+            self._built_at = self._synced_at = time.monotonic()
+
+    def pull(self):
+        with self._lock:
+            watermark = timezone.now() - timedelta(seconds=self.sync_interval)
+            rows = Friend.objects.filter(created_at__gte=self._watermark).values_list('user_id', 'friend_user_id')
+            for user_id, friend_id in rows:
+                self._link(user_id, friend_id)
+            self._watermark = watermark
+            self._synced_at = time.monotonic()
+
+    def suggest(self, user_id, limit=20):
+        """Return [(user id, mutual friend count)] for the best two-hop candidates of `user_id`."""
+        self.refresh()
+        with self._lock:
+            node = self._ids.get(user_id)
+            if node is None:
+                return []
+            friends = self._adjacency[node]
+            adjacency = self._adjacency
+            counts = Counter(chain.from_iterable(adjacency[friend] for friend in islice(friends, self.max_scan)))
+            counts.pop(node, None)
+            for friend in friends:
+                counts.pop(friend, None)
+            best = heapq.nlargest(limit, counts.items(), key=itemgetter(1))
+            return [(self._users[candidate], mutual) for candidate, mutual in best]
+
+    def stats(self):
+        with self._lock:
+            return {'users': len(self._users), 'edges': sum(map(len, self._adjacency)) // 2}
+
+
+friend_graph = FriendGraph(
+    sync_interval=_config.get('SYNC_INTERVAL', 30),
+    rebuild_interval=_config.get('REBUILD_INTERVAL', 600),
+    max_scan=_config.get('MAX_SCAN', 2000),
+)
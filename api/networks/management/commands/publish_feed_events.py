@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.networks.feed import BATCH_SIZE, deliver_pending
+
+
+class Command(BaseCommand):
+    help = 'Fan out queued feed events into friends\' timelines, retrying failed ones with exponential backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Deliver what is due now and exit')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when nothing is due')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                delivered, retried, failed = deliver_pending(options['batch_size'])
+                if delivered or retried or failed:
+                    self.stdout.write(f'delivered {delivered}, retrying {retried}, failed {failed}')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
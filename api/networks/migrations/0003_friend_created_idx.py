@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('networks', '0002_feedbroadcaster_feedentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='friend',
+            index=models.Index(fields=['created_at'], name='friend_created_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('networks', '0003_friend_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='friend',
+            index=models.Index(fields=['user', 'friend_user'], name='friend_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friend',
+            index=models.Index(fields=['friend_user', 'user'], name='friend_friend_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendrequest',
+            index=models.Index(fields=['to_user', 'from_user'], name='friend_request_to_idx'),
+        ),
+    ]
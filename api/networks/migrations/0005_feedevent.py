@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0014_storedblob'),
+        ('networks', '0004_relationship_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('verb', models.CharField(choices=[('book', 'Uploaded a book'), ('rating', 'Rated a book'), ('comment', 'Commented on a book')], max_length=10)),
+                ('rating', models.PositiveSmallIntegerField(null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.book')),
+                ('comment', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.comment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['next_attempt_at'], name='feed_event_due_idx')],
+            },
+        ),
+    ]
@@ -1,5 +1,8 @@
 import uuid
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from api.books.models import Book, Comment
 from api.users.models import User
 
 
@@ -14,6 +17,9 @@ class FriendRequest(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['from_user', 'to_user'], name="unique_friend_requests")
         ]
+        indexes = [
+            models.Index(fields=['to_user', 'from_user'], name="friend_request_to_idx"),
+        ]
         ordering = ["-created_at"]
 
     def __str__(self):
@@ -25,3 +31,59 @@ class Friend(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="user_friends")
     friend_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="friend_of_user_friends")
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name="friend_created_idx"),
+            models.Index(fields=['user', 'friend_user'], name="friend_user_idx"),
+            models.Index(fields=['friend_user', 'user'], name="friend_friend_user_idx"),
+        ]
+
+
+class FeedEntry(models.Model):
+    """One activity in one reader's timeline; `owner` is NULL for rows read by fan-out-on-read."""
+    BOOK = 'book'
+    RATING = 'rating'
+    COMMENT = 'comment'
+    VERBS = [(BOOK, 'Uploaded a book'), (RATING, 'Rated a book'), (COMMENT, 'Commented on a book')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, null=True, on_delete=models.CASCADE, related_name="feed_entries")
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    verb = models.CharField(max_length=10, choices=VERBS)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    comment = models.ForeignKey(Comment, null=True, on_delete=models.CASCADE, related_name="+")
+    rating = models.PositiveSmallIntegerField(null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-id'], name="feed_owner_idx"),
+            models.Index(fields=['actor', '-created_at', '-id'], name="feed_broadcast_idx",
+                         condition=Q(owner__isnull=True)),
+        ]
+
+
+class FeedBroadcaster(models.Model):
+    """Users with too many friends to fan out to; readers pull their broadcast rows instead."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="feed_broadcaster")
+    since = models.DateTimeField(auto_now_add=True)
+
+
+class FeedEvent(models.Model):
+    """An activity waiting to be fanned out; written in the transaction that caused it and deleted once delivered."""
+    id = models.BigAutoField(primary_key=True)
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    verb = models.CharField(max_length=10, choices=FeedEntry.VERBS)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    comment = models.ForeignKey(Comment, null=True, on_delete=models.CASCADE, related_name="+")
+    rating = models.PositiveSmallIntegerField(null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name="feed_event_due_idx"),
+        ]
@@ -0,0 +1,50 @@
+from django.db.models import CharField, F, Q, Value
+
+from .models import Friend, FriendRequest
+
+SELF = 'self'
+FRIEND = 'friend'
+REQUEST_SENT = 'request_sent'
+REQUEST_RECEIVED = 'request_received'
+NONE = 'none'
+
+# A friendship wins over a leftover request between the same pair.
+PRECEDENCE = {FRIEND: 0, REQUEST_SENT: 1, REQUEST_RECEIVED: 2}
+
+
+def pair_requests(user_id, other_id):
+    """FriendRequest rows between two users, in either direction."""
+    return FriendRequest.objects.filter(Q(from_user_id=user_id, to_user_id=other_id)
+                                        | Q(from_user_id=other_id, to_user_id=user_id))
+
+
+def _branch(queryset, other, kind):
+    return queryset.annotate(other=F(other), kind=Value(kind, output_field=CharField())) \
+        .values_list('id', 'other', 'kind').order_by()
+
+
+def relationship_statuses(user, user_ids):
+    """Map each of `user_ids` to (status, id of the Friend or FriendRequest row) in one query.
+
+    Each UNION ALL branch is an index seek: FriendRequest on (from_user,
+    to_user) and (to_user, from_user), Friend on the same two orders.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    others = [user_id for user_id in user_ids if user_id != user.pk]
+    found = {}
+    if others:
+        rows = _branch(FriendRequest.objects.filter(from_user=user, to_user__in=others, accepted=False),
+                       'to_user_id', REQUEST_SENT).union(
+            _branch(FriendRequest.objects.filter(to_user=user, from_user__in=others, accepted=False),
+                    'from_user_id', REQUEST_RECEIVED),
+            _branch(Friend.objects.filter(user=user, friend_user__in=others), 'friend_user_id', FRIEND),
+            _branch(Friend.objects.filter(friend_user=user, user__in=others), 'user_id', FRIEND),
+            all=True,
+        )
+        for row_id, other, kind in rows:
+            if other not in found or PRECEDENCE[kind] < PRECEDENCE[found[other][0]]:
+                found[other] = (kind, row_id)
+    return {
+        user_id: (SELF, None) if user_id == user.pk else found.get(user_id, (NONE, None))
+        for user_id in user_ids
+    }
@@ -1,5 +1,7 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import FriendRequest, Friend
+from api.books.serializers import BookViewSerializer
+from .models import FeedEntry, FriendRequest, Friend
 
 
 class FriendRequestSerializer(serializers.ModelSerializer):
@@ -9,13 +11,33 @@ class FriendRequestSerializer(serializers.ModelSerializer):
         read_only_fields = ['from_user', 'accepted']
 
 
-class FriendSerializer(serializers.Serializer):
-    user = serializers.SerializerMethodField()
-    friends = serializers.SerializerMethodField()
+class FriendSerializer(serializers.ModelSerializer):
+    user = serializers.CharField(source='user.email', read_only=True)
+    friend_user = serializers.CharField(source='friend_user.email', read_only=True)
 
-    def get_user(self):
-        return self.context['request'].user
+    class Meta:
+        model = Friend
+        fields = ['id', 'user', 'friend_user', 'created_at']
+
+
+class RelationshipLookupSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False,
+                                max_length=settings.RELATIONSHIP_LOOKUP_MAX)
+
+
+class FeedEntrySerializer(serializers.ModelSerializer):
+    actor = serializers.SerializerMethodField()
+    book = BookViewSerializer(read_only=True)
+    comment = serializers.SerializerMethodField()
+
+    class Meta:
+        model = FeedEntry
+        fields = ['id', 'verb', 'actor', 'book', 'comment', 'rating', 'created_at']
+
+    def get_actor(self, obj):
+        return {'id': obj.actor_id, 'name': obj.actor.name}
 
-    def get_friends(self):
-        friends = Friend.objects.filter(user=self.context['request'].user).all()
-        return friends
+    def get_comment(self, obj):
+        if obj.comment is None:
+            return None
+        return {'id': obj.comment_id, 'content': obj.comment.content}
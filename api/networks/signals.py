@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.books.models import Book, Comment
+from api.books.signals import ratings_changed
+from .feed import forget_friendship, queue_events
+from .graph import friend_graph
+from .models import FeedEntry, Friend
+
+
+@receiver(post_save, sender=Book)
+def publish_book(sender, instance, created, **kwargs):
+    if created and not instance.is_private:
+        queue_events([(instance.user_id, FeedEntry.BOOK, instance.pk, None, None)])
+
+
+@receiver(post_save, sender=Comment)
+def publish_comment(sender, instance, created, **kwargs):
+    if created:
+        queue_events([(instance.user_id, FeedEntry.COMMENT, instance.book_id, instance.pk, None)])
+
+
+@receiver(ratings_changed)
+def publish_ratings(sender, user, ratings, **kwargs):
+    queue_events([(user.pk, FeedEntry.RATING, book_id, None, value) for book_id, value in ratings.items()])
+
+
+@receiver(post_delete, sender=Friend)
+def forget_friend(sender, instance, **kwargs):
+    forget_friendship(instance.user_id, instance.friend_user_id)
+
+
+@receiver(post_save, sender=Friend)
+def link_friends(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: friend_graph.add(instance.user_id, instance.friend_user_id))
+
+
+@receiver(post_delete, sender=Friend)
+def unlink_friends(sender, instance, **kwargs):
+    transaction.on_commit(lambda: friend_graph.remove(instance.user_id, instance.friend_user_id))
@@ -1,3 +1,52 @@
+from unittest import mock
+
+from django.db import OperationalError
 from django.test import TestCase
+from django.utils import timezone
+
+from api.books.models import Book
+from api.users.models import User
+from .feed import deliver_pending
+from .models import FeedEntry, FeedEvent, Friend
+
+
+class FeedEventTests(TestCase):
+    def setUp(self):
+        self.actor = User.objects.create_user(email='actor@example.com', name='actor', password='Passw0rdX')
+        self.friend = User.objects.create_user(email='friend@example.com', name='friend', password='Passw0rdX')
+        Friend.objects.create(user=self.actor, friend_user=self.friend)
+
+    def create_book(self):
+        return Book.objects.create(user=self.actor, title='Title', description='Description',
+                                   cover='medias/book/covers/cover.jpg', book='medias/book/books/book.pdf')
+
+    def test_new_book_is_queued_and_fanned_out(self):
+        book = self.create_book()
+        self.assertEqual(FeedEvent.objects.filter(book=book).count(), 1)
+
+        self.assertEqual(deliver_pending(), (1, 0, 0))
+
+        entry = FeedEntry.objects.get(owner=self.friend)
+        self.assertEqual((entry.actor_id, entry.verb, entry.book_id), (self.actor.pk, FeedEntry.BOOK, book.pk))
+        self.assertFalse(FeedEvent.objects.exists())
+
+    def test_failed_fan_out_is_retried_later(self):
+        self.create_book()
+        with mock.patch('api.networks.feed.publish', side_effect=OperationalError('database table is locked')):
+            self.assertEqual(deliver_pending(), (0, 1, 0))
+
+        event = FeedEvent.objects.get()
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('database table is locked', event.last_error)
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        self.assertEqual(deliver_pending(), (0, 0, 0))
+        self.assertFalse(FeedEntry.objects.exists())
+
+        FeedEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(), (1, 0, 0))
+        self.assertTrue(FeedEntry.objects.filter(owner=self.friend).exists())
 
-# Create your tests here.
+    def test_private_books_are_not_queued(self):
+        Book.objects.create(user=self.actor, title='Title', description='Description', is_private=True,
+                            cover='medias/book/covers/cover.jpg', book='medias/book/books/book.pdf')
+        self.assertFalse(FeedEvent.objects.exists())
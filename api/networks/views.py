@@ -1,15 +1,29 @@
-from django.db.models import Q
-from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db import IntegrityError, transaction
 
 from rest_framework.response import Response
-from rest_framework import viewsets, mixins, status
+from rest_framework import exceptions, viewsets, mixins, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes
 
+from ..conditional import conditional_response, make_etag
 from ..users.models import User
 from .models import Friend, FriendRequest
+from ..books.pagination import KeysetPagination
 from ..books.permissions import IsOwnerOrReadOnly
-from .serializers import FriendRequestSerializer, FriendSerializer
+from .feed import FEED_ORDERING, feed_queryset
+from .graph import MAX_SUGGESTIONS, friend_graph
+from .relationships import FRIEND, NONE, SELF, pair_requests, relationship_statuses
+from .serializers import FeedEntrySerializer, FriendRequestSerializer, FriendSerializer, RelationshipLookupSerializer
+
+
+def incoming_requests_response(request):
+    requests_queryset = FriendRequest.objects.filter(to_user=request.user, accepted=False)
+    state = requests_queryset.aggregate(count=Count('id'), latest=Max('created_at'))
+    etag = make_etag(request.user.pk, state['count'], state['latest'])
+    return conditional_response(
+        request, lambda: Response(FriendRequestSerializer(requests_queryset, many=True).data), etag=etag,
+    )
 
 
 class FriendRequestViewSet(mixins.CreateModelMixin,
@@ -18,32 +32,26 @@ class FriendRequestViewSet(mixins.CreateModelMixin,
     queryset = FriendRequest.objects.all()
     serializer_class = FriendRequestSerializer
 
+    def list(self, request, *args, **kwargs):
+        # The router's friend-requests/ route shadows the friend_requests view below.
+        return incoming_requests_response(request)
+
     def perform_create(self, serializer):
-        to_user_id = self.request.data.get('to_user')
+        to_user = serializer.validated_data['to_user']
+        state, _ = relationship_statuses(self.request.user, [to_user.pk])[to_user.pk]
+        if state == SELF:
+            raise exceptions.ValidationError({'message': 'You cannot befriend yourself'})
+        if state == FRIEND:
+            raise exceptions.ValidationError({'message': 'Friend request already accepted'})
+        if state != NONE:
+            raise exceptions.ValidationError({'message': 'Friend request already sent'})
         try:
-            to_user_model = User.objects.get(id=to_user_id)
-        except User.DoesNotExist:
-            return Response({'message': 'Invalid user ID'}, status=status.HTTP_400_BAD_REQUEST)
-
-        friend_request_to_current_user = FriendRequest.objects.filter(
-            Q(from_user=to_user_model) & Q(to_user=self.request.user)
-        ).first()
-
-        my_request = FriendRequest.objects.filter(
-            Q(from_user=self.request.user) & Q(to_user=to_user_model)
-        ).first()
-
-        if friend_request_to_current_user:
-            if friend_request_to_current_user.accepted:
-                return Response({'message': 'Friend request already accepted'}, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                return Response({'message': 'Friend request already sent'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if my_request:
-            return Response({'message': 'Friend request already sent'}, status=status.HTTP_400_BAD_REQUEST)
-
-        serializer.save(from_user=self.request.user, to_user=to_user_model)
-        return Response({'message': 'Friend request sent'}, status=status.HTTP_201_CREATED)
+            with transaction.atomic():
+                # An accepted request outliving its friendship would block the new one.
+                pair_requests(self.request.user.pk, to_user.pk).filter(accepted=True).delete()
+                serializer.save(from_user=self.request.user, to_user=to_user)
+        except IntegrityError:
+            raise exceptions.ValidationError({'message': 'Friend request already sent'})
 
     def get_permissions(self):
         if self.request.method in ["DELETE"]:
@@ -51,12 +59,22 @@ class FriendRequestViewSet(mixins.CreateModelMixin,
         return [IsAuthenticated()]
 
 
+class FeedViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    serializer_class = FeedEntrySerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return feed_queryset(self.request.user)
+
+    def get_cursor_ordering(self):
+        return FEED_ORDERING
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def friend_requests(request, *args, **kwargs):
-    requests_queryset = FriendRequest.objects.filter(to_user=request.user, accepted=False)
-    serializer = FriendRequestSerializer(requests_queryset, many=True)
-    return Response(serializer.data)
+    return incoming_requests_response(request)
 
 
 @api_view(['GET'])
@@ -82,7 +100,7 @@ def request_action(request, *args, **kwargs):
             friend_user = request_id.from_user
             request_id.accepted = True
             request_id.save()
-            Friend.objects.create(user=request.user, friend=friend_user)
+            Friend.objects.create(user=request.user, friend_user=friend_user)
             return Response({'message': 'Friend request accepted'}, status=status.HTTP_200_OK)
         else:
             return Response({'message': 'Invalid action'}, status=status.HTTP_400_BAD_REQUEST)
@@ -95,7 +113,7 @@ def request_action(request, *args, **kwargs):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_friends(request, *args, **kwargs):
-    queryset = Friend.objects.filter(user=request.user).all()
+    queryset = Friend.objects.filter(user=request.user).select_related('user', 'friend_user')
     serializer = FriendSerializer(queryset, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -104,8 +122,43 @@ def get_friends(request, *args, **kwargs):
 @permission_classes([IsAuthenticated, IsOwnerOrReadOnly])
 def delete_friend(request, *args, **kwargs):
     try:
-        friend = Friend.objects.get(pk=kwargs['pk'])
-        friend.delete()
+        with transaction.atomic():
+            friend = Friend.objects.get(pk=kwargs['pk'])
+            friend.delete()
+            # The accepted request would otherwise block a new one between the pair.
+            pair_requests(friend.user_id, friend.friend_user_id).delete()
         return Response(status=status.HTTP_200_OK)
     except Friend.DoesNotExist:
         return Response("Not friend such id", status=status.HTTP_404_NOT_FOUND)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def friend_suggestions(request, *args, **kwargs):
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), MAX_SUGGESTIONS)
+    except ValueError:
+        return Response({'message': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Over-fetch so candidates dropped below still leave a full page.
+    candidates = dict(friend_graph.suggest(request.user.pk, limit * 2))
+    pending = FriendRequest.objects.filter(
+        Q(from_user=request.user, to_user__in=list(candidates)) | Q(to_user=request.user, from_user__in=list(candidates))
+    ).values_list('from_user_id', 'to_user_id')
+    for pair in pending:
+        for user_id in pair:
+            candidates.pop(user_id, None)
+    users = User.objects.filter(pk__in=list(candidates), is_active=True).only('id', 'name').in_bulk()
+    ranked = sorted(users, key=lambda user_id: -candidates[user_id])[:limit]
+    data = [{'id': user_id, 'name': users[user_id].name, 'mutual_friends': candidates[user_id]} for user_id in ranked]
+    return Response(data, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def relationships(request, *args, **kwargs):
+    serializer = RelationshipLookupSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    statuses = relationship_statuses(request.user, serializer.validated_data['ids'])
+    data = {str(user_id): {'status': state, 'id': row_id} for user_id, (state, row_id) in statuses.items()}
+    return Response(data, status=status.HTTP_200_OK)
@@ -0,0 +1,164 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'5/min' -> (5, 60.0); the period may carry a multiplier, e.g. '10/15m'."""
+    count, period = rate.split('/')
+    multiplier = ''.join(ch for ch in period if ch.isdigit()) or '1'
+    unit = period.lstrip('0123456789')[:1]
+    return int(count), float(multiplier) * PERIODS[unit]
+
+
+def gcra(tat, now, interval, burst):
+    """Return (allowed, new theoretical arrival time, seconds to wait).
+
+    The generic cell rate algorithm: a token bucket of `burst` cells refilled
+    one per `interval`, stored as a single timestamp per key.
+    """
+    tat = max(tat or now, now)
+    tolerance = interval * (burst - 1)
+    if tat - now > tolerance:
+        return False, tat, tat - tolerance - now
+    return True, tat + interval, 0.0
+
+
+class MemoryStore:
+    """Per-process store; limits only hold within one worker."""
+
+    def __init__(self, **options):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def hit(self, key, interval, burst):
+        now = time.time()
+        with self.lock:
+            allowed, tat, wait = gcra(self.data.get(key), now, interval, burst)
+            self.data[key] = tat
+            if len(self.data) > 100000:
+                self.data = {k: v for k, v in self.data.items() if v > now}
+        return allowed, wait
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class SQLiteStore:
+    """Store shared by every worker on the host through one small SQLite file.
+
+    Each check is a primary key lookup and upsert inside a BEGIN IMMEDIATE
+    transaction, so concurrent workers serialise on the file lock.
+    """
+
+    def __init__(self, path, timeout=1.0, purge_probability=0.001, **options):
+        self.path = str(path)
+        self.timeout = timeout
+        self.purge_probability = purge_probability
+        self.local = threading.local()
+
+    def connection(self):
+        # Connections must not cross a fork, so they are keyed by pid as well as thread.
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('CREATE TABLE IF NOT EXISTS throttle (key TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID')
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def hit(self, key, interval, burst):
+        now = time.time()
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tat FROM throttle WHERE key = ?', (key,)).fetchone()
+            allowed, tat, wait = gcra(row[0] if row else None, now, interval, burst)
+            if allowed:
+                conn.execute('INSERT INTO throttle (key, tat) VALUES (?, ?) '
+                             'ON CONFLICT (key) DO UPDATE SET tat = excluded.tat', (key, tat))
+            if random.random() < self.purge_probability:
+                conn.execute('DELETE FROM throttle WHERE tat < ?', (now,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, wait
+
+    def clear(self):
+        self.connection().execute('DELETE FROM throttle')
+
+
+_config = getattr(settings, 'THROTTLE_STORE', {})
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                options = {k.lower(): v for k, v in _config.items() if k != 'BACKEND'}
+                _store = import_string(_config.get('BACKEND', 'api.throttling.MemoryStore'))(**options)
+    return _store
+
+
+class GCRAThrottle(BaseThrottle):
+    """Token-bucket throttle over `get_store()`; rates come from DEFAULT_THROTTLE_RATES[scope].
+
+    Requests are keyed by client address unless `get_ident_key` says
+    otherwise. A refused request does not consume a cell, so clients that
+    honour Retry-After get through as soon as it elapses.
+    """
+
+    scope = None
+
+    def __init__(self):
+        self.limit, self.period = parse_rate(api_settings.DEFAULT_THROTTLE_RATES[self.scope])
+        self.interval = self.period / self.limit
+        self.delay = None
+
+    def get_ident_key(self, request, view):
+        # REMOTE_ADDR, or the X-Forwarded-For entry added by the last of NUM_PROXIES trusted proxies.
+        return self.get_ident(request)
+
+    def allow_request(self, request, view):
+        ident = self.get_ident_key(request, view)
+        if ident is None:
+            return True
+        allowed, wait = get_store().hit(f'{self.scope}:{ident}', self.interval, self.limit)
+        self.delay = wait
+        return allowed
+
+    def wait(self):
+        return self.delay
+
+
+class IPThrottle(GCRAThrottle):
+    """Keyed by client address only."""
+
+
+class AccountThrottle(GCRAThrottle):
+    """Keyed by the authenticated user, or by the account named in the request body."""
+
+    field = 'email'
+
+    def get_ident_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        value = request.data.get(self.field) if hasattr(request.data, 'get') else None
+        if not isinstance(value, str) or not value.strip():
+            return None
+        return f'{self.field}:{value.strip().lower()}'
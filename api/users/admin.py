@@ -1,5 +1,6 @@
 from django.contrib import admin
 
-from api.users.models import User
+from api.users.models import AccountDeletion, User
 
 admin.site.register(User)
+admin.site.register(AccountDeletion)
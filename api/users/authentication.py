@@ -0,0 +1,98 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+_config = getattr(settings, 'AUTH_USER_CACHE', {})
+VERIFIED_CLAIM = 'verified'
+TRUST_VERIFIED_CLAIM = _config.get('VERIFIED_CLAIM', False)
+
+
+class UserCache:
+    """Bounded per-process LRU of User rows.
+
+    Each entry remembers the user's version stamp, kept in a Django cache
+    alias shared by every process (the response version store) and bumped
+    on every save or delete, so a deactivation or password change made by
+    any worker or management command is seen by all of them on their next
+    request. TTL only bounds how long an unchanged row is trusted.
+    """
+
+    def __init__(self, alias='versions', max_size=10000, ttl=300):
+        self.alias = alias
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def version(self, user_id):
+        backend = caches[self.alias]
+        key = f'user-version:{user_id}'
+        version = backend.get(key)
+        if version is None:
+            backend.add(key, time.time_ns(), None)
+            version = backend.get(key)
+        return version
+
+    def get_or_load(self, user_id, load):
+        # The stamp is read before loading so a concurrent bump invalidates what we store.
+        version = self.version(user_id)
+        key = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == version and entry[2] > now:
+                self._entries.move_to_end(key)
+                return copy.copy(entry[0])
+        user = load()
+        with self._lock:
+            self._entries[key] = (user, version, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return copy.copy(user)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+        # A fresh timestamp rather than incr, which shared backends implement with a racy get/set.
+        caches[self.alias].set(f'user-version:{user_id}', time.time_ns(), None)
+
+    def invalidate_on_commit(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+        transaction.on_commit(lambda: self.invalidate(user_id))
+
+
+user_cache = UserCache(
+    alias=_config.get('ALIAS', 'versions'),
+    max_size=_config.get('MAX_SIZE', 10000),
+    ttl=_config.get('TTL', 300),
+)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication resolving users through `user_cache` instead of one query per request."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = user_cache.get_or_load(user_id, lambda: super(CachedJWTAuthentication, self).get_user(validated_token))
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            from rest_framework_simplejwt.utils import get_md5_hash_password
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
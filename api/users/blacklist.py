@@ -0,0 +1,139 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+_config = getattr(settings, 'TOKEN_BLACKLIST_FILTER', {})
+STAMP_KEY = 'token-blacklist-stamp'
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class BlacklistIndex:
+    """In-process Bloom filter of blacklisted JTIs, synced incrementally by BlacklistedToken.id.
+
+    A miss proves the token is not blacklisted; a hit is confirmed against
+    the database. New rows are pulled when the shared stamp moves (every
+    blacklist() bumps it) or after SYNC_INTERVAL seconds, and the filter is
+    rebuilt from unexpired rows every REBUILD_INTERVAL so it sheds pruned JTIs.
+    """
+
+    def __init__(self, alias='default', capacity=100000, error_rate=0.001, sync_interval=5, rebuild_interval=3600):
+        self.alias = alias
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._filter = None
+        self._last_id = 0
+        self._stamp = None
+        self._synced_at = 0.0
+        self._built_at = 0.0
+
+    def stamp(self):
+        return caches[self.alias].get(STAMP_KEY)
+
+    def bump(self):
+        backend = caches[self.alias]
+        try:
+            backend.incr(STAMP_KEY)
+        except ValueError:
+            backend.set(STAMP_KEY, time.time_ns(), None)
+
+    def might_contain(self, jti):
+        self.refresh()
+        return jti in self._filter
+
+    def add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+
+    def refresh(self):
+        now = time.monotonic()
+        stamp = self.stamp()
+        if self._filter is not None and stamp == self._stamp and now - self._synced_at < self.sync_interval:
+            return
+        with self._lock:
+            if self._filter is None or now - self._built_at >= self.rebuild_interval:
+                self._rebuild(now)
+            else:
+                self._pull()
+            self._stamp = stamp
+            self._synced_at = now
+
+    def _rows(self, **filters):
+        return BlacklistedToken.objects.filter(**filters).order_by('id').values_list('id', 'token__jti')
+
+    def _rebuild(self, now):
+        live = self._rows(token__expires_at__gt=timezone.now())
+        bloom = BloomFilter(max(self.capacity, live.count() * 2), self.error_rate)
+        last_id = 0
+        for row_id, jti in live.iterator(chunk_size=5000):
+            bloom.add(jti)
+            last_id = row_id
+        self._filter = bloom
+        self._last_id = max(last_id, BlacklistedToken.objects.order_by('-id').values_list('id', flat=True).first() or 0)
+        self._built_at = now
+
+    def _pull(self):
+        for row_id, jti in self._rows(id__gt=self._last_id).iterator():
+            self._filter.add(jti)
+            self._last_id = row_id
+        if self._filter.count > self._filter.capacity:
+            self._built_at = 0.0
+
+
+blacklist_index = BlacklistIndex(
+    alias=_config.get('ALIAS', 'default'),
+    capacity=_config.get('CAPACITY', 100000),
+    error_rate=_config.get('ERROR_RATE', 0.001),
+    sync_interval=_config.get('SYNC_INTERVAL', 5),
+    rebuild_interval=_config.get('REBUILD_INTERVAL', 3600),
+)
+
+
+class RefreshToken(BaseRefreshToken):
+    """Refresh token whose blacklist check only reaches the database on a Bloom filter hit."""
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if blacklist_index.might_contain(jti) and BlacklistedToken.objects.filter(token__jti=jti).exists():
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_index.add(self.payload[api_settings.JTI_CLAIM])
+        transaction.on_commit(blacklist_index.bump)
+        return result
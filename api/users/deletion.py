@@ -0,0 +1,175 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from api.books.models import Book, BookUpload, Comment, Rating
+from api.books.ratings import apply_rating_changes, lock_books
+from api.books.uploads import discard_part
+from api.chatapp.models import Message
+from api.networks.models import FeedEntry, Friend, FriendRequest
+from .blacklist import blacklist_index
+from .models import AccountDeletion, User
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'ACCOUNT_DELETION', {})
+BATCH_SIZE = _config.get('BATCH_SIZE', 500)
+# Each book drags its ratings, comments and files along, so books go in smaller batches.
+BOOK_BATCH_SIZE = _config.get('BOOK_BATCH_SIZE', 20)
+MAX_ATTEMPTS = _config.get('MAX_ATTEMPTS', 5)
+BACKOFF = _config.get('BACKOFF', 60)
+LEASE = _config.get('LEASE', 300)
+
+
+def request_deletion(user):
+    """Deactivate `user` at once and queue the removal of everything they own."""
+    with transaction.atomic():
+        user.is_active = False
+        user.deleted_at = timezone.now()
+        user.save(update_fields=['is_active', 'deleted_at'])
+        job, _ = AccountDeletion.objects.get_or_create(user_id=user.pk, defaults={'email': user.email})
+    return job
+
+
+def _first(queryset, limit):
+    return list(queryset.order_by().values_list('pk', flat=True)[:limit])
+
+
+def _delete(model, ids):
+    if ids:
+        model.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def revoke_tokens(user_id, limit):
+    ids = _first(OutstandingToken.objects.filter(user_id=user_id, blacklistedtoken__isnull=True), limit)
+    BlacklistedToken.objects.bulk_create([BlacklistedToken(token_id=pk) for pk in ids], ignore_conflicts=True)
+    if ids:
+        transaction.on_commit(blacklist_index.bump)
+    return len(ids)
+
+
+def delete_ratings(user_id, limit):
+    rows = list(Rating.objects.filter(user_id=user_id).order_by().values_list('pk', 'book_id', 'rating')[:limit])
+    if rows:
+        lock_books({book_id for _, book_id, _ in rows})
+        Rating.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+        apply_rating_changes([(book_id, value, None) for _, book_id, value in rows])
+    return len(rows)
+
+
+def delete_comments(user_id, limit):
+    return _delete(Comment, _first(Comment.objects.filter(user_id=user_id), limit))
+
+
+def delete_books(user_id, limit):
+    # Files and cover variants go through the Book post_delete handler once the batch commits.
+    return _delete(Book, _first(Book.objects.filter(user_id=user_id), min(limit, BOOK_BATCH_SIZE)))
+
+
+def delete_uploads(user_id, limit):
+    uploads = list(BookUpload.objects.filter(user_id=user_id).only('id')[:limit])
+    for upload in uploads:
+        discard_part(upload)
+    return _delete(BookUpload, [upload.pk for upload in uploads])
+
+
+def delete_messages(user_id, limit):
+    return _delete(Message, _first(Message.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id)), limit))
+
+
+def delete_friend_requests(user_id, limit):
+    return _delete(FriendRequest, _first(
+        FriendRequest.objects.filter(Q(from_user_id=user_id) | Q(to_user_id=user_id)), limit))
+
+
+def delete_friends(user_id, limit):
+    return _delete(Friend, _first(Friend.objects.filter(Q(user_id=user_id) | Q(friend_user_id=user_id)), limit))
+
+
+def delete_feed(user_id, limit):
+    return _delete(FeedEntry, _first(FeedEntry.objects.filter(Q(owner_id=user_id) | Q(actor_id=user_id)), limit))
+
+
+def delete_account(user_id, limit):
+    # Only small leftovers (the feed broadcaster flag) still cascade from here.
+    return User.objects.filter(pk=user_id).delete()[1].get(User._meta.label, 0)
+
+
+STAGES = [
+    ('tokens', revoke_tokens),
+    ('ratings', delete_ratings),
+    ('comments', delete_comments),
+    ('books', delete_books),
+    ('uploads', delete_uploads),
+    ('messages', delete_messages),
+    ('friend_requests', delete_friend_requests),
+    ('friends', delete_friends),
+    ('feed', delete_feed),
+    ('account', delete_account),
+]
+
+
+def claim():
+    """Lease the next due job to this worker, or return None."""
+    now = timezone.now()
+    with transaction.atomic():
+        job = AccountDeletion.objects.select_for_update(skip_locked=True).filter(
+            status=AccountDeletion.PENDING, next_attempt_at__lte=now,
+        ).order_by('next_attempt_at').first()
+        if job is not None:
+            job.next_attempt_at = now + timedelta(seconds=LEASE)
+            job.save(update_fields=['next_attempt_at'])
+    return job
+
+
+def process(job, batch_size=BATCH_SIZE, pause=0.0, on_batch=None):
+    """Run `job` from its recorded stage to the end, one short transaction per batch.
+
+    Every batch commits together with the job's progress, so a crash loses at
+    most the batch in flight and the next worker resumes at the same stage.
+    """
+    names = [name for name, _ in STAGES]
+    start = names.index(job.stage) if job.stage in names else 0
+    for name, step in STAGES[start:]:
+        while True:
+            with transaction.atomic():
+                removed = step(job.user_id, batch_size)
+                job.stage = name
+                job.counts[name] = job.counts.get(name, 0) + removed
+                job.next_attempt_at = timezone.now() + timedelta(seconds=LEASE)
+                job.save(update_fields=['stage', 'counts', 'next_attempt_at', 'updated_at'])
+            if on_batch:
+                on_batch(job, name, removed)
+            if not removed:
+                break
+            time.sleep(pause)
+    job.status = AccountDeletion.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at', 'updated_at'])
+
+
+def process_next(batch_size=BATCH_SIZE, pause=0.0, on_batch=None):
+    """Claim and run one due job; failures are retried later from the stage they reached."""
+    job = claim()
+    if job is None:
+        return None
+    try:
+        process(job, batch_size, pause, on_batch)
+    except Exception as exc:
+        job.attempts += 1
+        job.last_error = f'{type(exc).__name__}: {exc}'[:2000]
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = AccountDeletion.FAILED
+            logger.error('Giving up on deleting account %s at stage %s: %s', job.user_id, job.stage, job.last_error)
+        else:
+            job.next_attempt_at = timezone.now() + timedelta(seconds=BACKOFF * 2 ** (job.attempts - 1))
+            logger.warning('Deleting account %s failed at stage %s: %s', job.user_id, job.stage, job.last_error)
+        job.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at', 'updated_at'])
+    return job
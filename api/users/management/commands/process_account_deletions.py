@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.users.deletion import BATCH_SIZE, process_next
+
+
+class Command(BaseCommand):
+    help = ('Remove the data of deleted accounts in bounded batches, reporting progress per batch; '
+            'an interrupted job resumes from the stage it reached')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the jobs that are due now and exit')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when nothing is due')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                job = process_next(options['batch_size'], options['pause'], self.report)
+                if job is not None:
+                    self.stdout.write(f'account {job.user_id}: {job.status} {job.counts}')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def report(self, job, stage, removed):
+        if removed:
+            self.stdout.write(f'account {job.user_id}: {stage} -{removed} (total {job.counts[stage]})')
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+
+class Command(BaseCommand):
+    help = ('Delete expired outstanding refresh tokens (and their blacklist rows) in short batches, '
+            'so writers never wait on one long lock; schedule it e.g. hourly from cron')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now()
+        deleted = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            with transaction.atomic():
+                ids = list(OutstandingToken.objects.filter(expires_at__lt=cutoff)
+                           .order_by('id').values_list('id', flat=True)[:options['batch_size']])
+                if not ids:
+                    break
+                # BlacklistedToken rows go with them through the CASCADE.
+                OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            batches += 1
+            time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} expired tokens in {batches} batches'))
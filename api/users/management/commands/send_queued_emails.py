@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from api.users.outbox import BATCH_SIZE, Mailer, purge_sent, send_pending
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbound emails over one reused SMTP connection, retrying with exponential backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain what is due now and exit')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when nothing is due')
+        parser.add_argument('--idle-close', type=float, default=30.0,
+                            help='Close the SMTP connection after this many idle seconds')
+        parser.add_argument('--keep-days', type=int, default=7, help='Delete sent emails older than this')
+
+    def handle(self, *args, **options):
+        if not settings.DEFAULT_FROM_EMAIL:
+            raise CommandError('No sender address: set EMAIL_HOST_USER (and EMAIL_HOST_PASSWORD) or DEFAULT_FROM_EMAIL')
+        mailer = Mailer()
+        idle_since = time.monotonic()
+        last_purge = 0.0
+        try:
+            while True:
+                close_old_connections()
+                sent, retried, failed = send_pending(mailer, options['batch_size'])
+                if sent or retried or failed:
+                    idle_since = time.monotonic()
+                    self.stdout.write(f'sent {sent}, retrying {retried}, failed {failed}')
+                    continue
+                if options['once']:
+                    break
+                if time.monotonic() - idle_since > options['idle_close']:
+                    mailer.close()
+                if time.monotonic() - last_purge > 3600:
+                    purge_sent(options['keep_days'])
+                    last_purge = time.monotonic()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            mailer.close()
@@ -0,0 +1,102 @@
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'EMAIL_OUTBOX', {})
+BATCH_SIZE = _config.get('BATCH_SIZE', 50)
+MAX_ATTEMPTS = _config.get('MAX_ATTEMPTS', 6)
+BACKOFF_BASE = _config.get('BACKOFF_BASE', 30)
+BACKOFF_MAX = _config.get('BACKOFF_MAX', 3600)
+# A claimed row becomes due again after this long if its worker dies mid-send.
+LEASE = _config.get('LEASE', 300)
+
+
+def enqueue_email(to_email, subject, body):
+    return OutboundEmail.objects.create(to_email=to_email, subject=subject, body=body)
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def claim(batch_size=BATCH_SIZE):
+    """Lease up to `batch_size` due emails to this worker by pushing their next attempt past the lease."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboundEmail.objects.select_for_update(skip_locked=True).filter(
+            status=OutboundEmail.PENDING, next_attempt_at__lte=now,
+        ).order_by('next_attempt_at')[:batch_size]
+        emails = list(due)
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]) \
+            .update(next_attempt_at=now + timedelta(seconds=LEASE))
+    return emails
+
+
+class Mailer:
+    """Keeps one SMTP connection open across batches and reopens it when the server drops it."""
+
+    def __init__(self):
+        self.connection = get_connection(fail_silently=False)
+        self.opened = False
+
+    def send(self, email):
+        message = EmailMessage(email.subject, email.body, settings.DEFAULT_FROM_EMAIL, [email.to_email],
+                               connection=self.connection)
+        if not self.opened:
+            self.connection.open()
+            self.opened = True
+        try:
+            message.send()
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            self.connection.open()
+            self.opened = True
+            message.send()
+
+    def close(self):
+        if self.opened:
+            try:
+                self.connection.close()
+            finally:
+                self.opened = False
+
+
+def send_pending(mailer, batch_size=BATCH_SIZE):
+    """Send one claimed batch; returns (sent, retried, failed)."""
+    sent = retried = failed = 0
+    for email in claim(batch_size):
+        email.attempts += 1
+        try:
+            mailer.send(email)
+        except Exception as exc:
+            # The connection may be half-broken; start the next message on a fresh one.
+            mailer.close()
+            email.last_error = f'{type(exc).__name__}: {exc}'[:2000]
+            if email.attempts >= MAX_ATTEMPTS:
+                email.status = OutboundEmail.FAILED
+                failed += 1
+                logger.error('Giving up on email %s to %s: %s', email.pk, email.to_email, email.last_error)
+            else:
+                email.next_attempt_at = timezone.now() + timedelta(seconds=backoff(email.attempts))
+                retried += 1
+            email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+        else:
+            email.status = OutboundEmail.SENT
+            email.sent_at = timezone.now()
+            email.save(update_fields=['attempts', 'status', 'sent_at'])
+            sent += 1
+    return sent, retried, failed
+
+
+def purge_sent(days):
+    cutoff = timezone.now() - timedelta(days=days)
+    return OutboundEmail.objects.filter(status=OutboundEmail.SENT, sent_at__lt=cutoff).delete()[0]
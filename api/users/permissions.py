@@ -1,10 +1,15 @@
 from rest_framework import permissions
 
+from .authentication import TRUST_VERIFIED_CLAIM, VERIFIED_CLAIM
+
 
 class IsVerifiedUser(permissions.BasePermission):
     def has_permission(self, request, view):
         if request.user.is_anonymous:
             return True
+        # A signed positive claim is final; a missing or false one may predate verification.
+        elif TRUST_VERIFIED_CLAIM and request.auth and request.auth.get(VERIFIED_CLAIM):
+            return True
         elif not request.user.verified:
             raise permissions.exceptions.PermissionDenied("You have not verified your email")
         else:
@@ -1,5 +1,8 @@
 import re
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from .authentication import TRUST_VERIFIED_CLAIM, VERIFIED_CLAIM
+from .blacklist import RefreshToken
 from .models import User
 
 
@@ -60,3 +63,18 @@ class PasswordSerializer(serializers.Serializer):
         if password != confirm_password:
             raise serializers.ValidationError("Password and confirm_password do not match")
         return data
+
+
+class VerifiedTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        if TRUST_VERIFIED_CLAIM:
+            token[VERIFIED_CLAIM] = user.verified
+        return token
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RefreshToken
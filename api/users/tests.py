@@ -1,3 +1,238 @@
-from django.test import TestCase
+import os
+import smtplib
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core import mail
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from api.books.models import Book, BookUpload, Comment, Rating, StoredBlob
+from api.books.ratings import upsert_ratings
+from api.books.uploads import part_path
+from api.chatapp.models import Message
+from api.networks.models import Friend, FriendRequest
+from api.throttling import MemoryStore
+from . import deletion
+from .authentication import UserCache, user_cache
+from .models import AccountDeletion, OutboundEmail, User
+from .outbox import BACKOFF_BASE, LEASE, MAX_ATTEMPTS, Mailer, claim, enqueue_email, send_pending
+from .throttling import LoginAccountThrottle, RegisterIPThrottle
+
+
+class ThrottleTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch('api.throttling._store', MemoryStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = APIRequestFactory()
+
+    def request(self, address='127.0.0.1', forwarded_for=None, **data):
+        extra = {'REMOTE_ADDR': address}
+        if forwarded_for:
+            extra['HTTP_X_FORWARDED_FOR'] = forwarded_for
+        request = Request(self.factory.post('/', data, format='json', **extra), parsers=[JSONParser()])
+        request.user = AnonymousUser()
+        return request
+
+    def test_ip_throttle_ignores_forwarded_for(self):
+        throttle = RegisterIPThrottle()
+        results = [throttle.allow_request(self.request(forwarded_for=f'10.0.0.{index}'), None)
+                   for index in range(throttle.limit + 1)]
+        self.assertEqual(results, [True] * throttle.limit + [False])
+        self.assertGreater(throttle.wait(), 0)
+        self.assertTrue(throttle.allow_request(self.request('127.0.0.2'), None))
+
+    def test_account_throttle_keys_on_the_submitted_email(self):
+        throttle = LoginAccountThrottle()
+        results = [throttle.allow_request(self.request(f'10.0.0.{index}', email='Reader@Example.com'), None)
+                   for index in range(throttle.limit)]
+        self.assertEqual(results, [True] * throttle.limit)
+        self.assertFalse(throttle.allow_request(self.request('10.0.1.1', email=' reader@example.com'), None))
+        self.assertTrue(throttle.allow_request(self.request('10.0.1.1', email='other@example.com'), None))
+
+
+class UserCacheTests(TestCase):
+    def test_a_change_in_one_process_reaches_the_others(self):
+        user = User.objects.create_user(email='reader@example.com', name='reader', password='Passw0rdX')
+        # A per-process store would hide the change from every other worker.
+        self.assertNotIsInstance(caches[user_cache.alias], LocMemCache)
+        # Another worker: its own LRU, the same version store.
+        worker = UserCache(alias=user_cache.alias)
+        load = lambda: User.objects.get(pk=user.pk)
+        self.assertTrue(worker.get_or_load(user.pk, load).is_active)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+
+        self.assertFalse(worker.get_or_load(user.pk, load).is_active)
+
+
+class UserBooksConditionalTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com', name='owner', password='Passw0rdX')
+        self.books = Book.objects.bulk_create([
+            Book(user=self.owner, title=f'Book {index}', description='Description',
+                 cover='medias/book/covers/cover.jpg', book='medias/book/books/book.pdf')
+            for index in range(2)
+        ])
+        self.url = '/api/users/owner@example.com/books/'
+
+    def test_etag_changes_when_a_book_is_deleted(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # The newest book stays, so max(updated_at) does not move.
+        self.books[0].delete()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   DEFAULT_FROM_EMAIL='noreply@example.com')
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.email = enqueue_email('reader@example.com', 'Subject', 'Body')
+
+    def test_worker_delivers_queued_emails(self):
+        call_command('send_queued_emails', once=True, stdout=mock.Mock())
+
+        self.assertEqual([message.to for message in mail.outbox], [['reader@example.com']])
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), (OutboundEmail.SENT, 1))
+        self.assertIsNotNone(self.email.sent_at)
+
+    def test_claimed_emails_are_leased(self):
+        started = timezone.now()
+        self.assertEqual(claim(), [self.email])
+        self.assertEqual(claim(), [])
+        self.email.refresh_from_db()
+        self.assertGreaterEqual(self.email.next_attempt_at, started + timedelta(seconds=LEASE))
+
+    def test_failures_back_off_then_give_up(self):
+        mailer = Mailer()
+        with mock.patch.object(Mailer, 'send', side_effect=smtplib.SMTPException('421 try later')):
+            started = timezone.now()
+            self.assertEqual(send_pending(mailer), (0, 1, 0))
+            self.email.refresh_from_db()
+            self.assertEqual((self.email.status, self.email.attempts), (OutboundEmail.PENDING, 1))
+            self.assertIn('421 try later', self.email.last_error)
+            self.assertGreaterEqual(self.email.next_attempt_at, started + timedelta(seconds=BACKOFF_BASE))
+            self.assertEqual(send_pending(mailer), (0, 0, 0))
+
+            OutboundEmail.objects.filter(pk=self.email.pk).update(
+                attempts=MAX_ATTEMPTS - 1, next_attempt_at=timezone.now())
+            self.assertEqual(send_pending(mailer), (0, 0, 1))
+        self.email.refresh_from_db()
+        self.assertEqual(self.email.status, OutboundEmail.FAILED)
+        self.assertEqual(mail.outbox, [])
+
+    def test_retry_after_backoff_delivers(self):
+        with mock.patch.object(Mailer, 'send', side_effect=smtplib.SMTPServerDisconnected('gone')):
+            send_pending(Mailer())
+        OutboundEmail.objects.filter(pk=self.email.pk).update(next_attempt_at=timezone.now())
+
+        self.assertEqual(send_pending(Mailer()), (1, 0, 0))
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), (OutboundEmail.SENT, 2))
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class AccountDeletionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name, BACKGROUND_TASKS_EAGER=True,
+                                     BOOK_UPLOAD_DIR=os.path.join(media_root.name, 'uploads'))
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(email='leaving@example.com', name='leaving', password='Passw0rdX')
+        self.other = User.objects.create_user(email='staying@example.com', name='staying', password='Passw0rdX')
+        self.books = [
+            Book.objects.create(user=self.user, title=f'Book {index}', description='Description', is_private=True,
+                                cover=ContentFile(f'cover {index}'.encode(), name='cover.jpg'),
+                                book=ContentFile(f'book {index}'.encode(), name='book.pdf'))
+            for index in range(3)
+        ]
+        self.kept = Book.objects.create(user=self.other, title='Kept', description='Description', is_private=True,
+                                        cover='medias/book/covers/cover.jpg', book='medias/book/books/book.pdf')
+        upsert_ratings(self.user, {self.kept.pk: 5})
+        Comment.objects.create(user=self.user, book=self.kept, content='Bye')
+        Friend.objects.create(user=self.user, friend_user=self.other)
+        FriendRequest.objects.create(from_user=self.other, to_user=self.user)
+        Message.objects.create(sender=self.other, receiver=self.user, message='Hello')
+        upload = BookUpload.objects.create(user=self.user, filename='book.pdf', size=1, checksum='0' * 64)
+        open(part_path(upload), 'wb').close()
+        self.part = part_path(upload)
+        self.blobs = [name for book in self.books for name in (book.book.name, book.cover.name)]
+
+    def process(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return deletion.process_next(batch_size=2)
+
+    def test_request_deactivates_at_once(self):
+        job = deletion.request_deletion(self.user)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertIsNotNone(self.user.deleted_at)
+        self.assertEqual((job.status, job.email), (AccountDeletion.PENDING, 'leaving@example.com'))
+
+    def test_worker_removes_everything_in_batches(self):
+        deletion.request_deletion(self.user)
+        job = self.process()
+
+        self.assertEqual(job.status, AccountDeletion.DONE)
+        self.assertEqual({stage: job.counts[stage] for stage in ('ratings', 'comments', 'books', 'uploads')},
+                         {'ratings': 1, 'comments': 1, 'books': 3, 'uploads': 1})
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(Book.objects.get().pk, self.kept.pk)
+        for model in (Rating, Comment, Friend, FriendRequest, Message, BookUpload):
+            self.assertFalse(model.objects.exists(), model.__name__)
+        self.kept.refresh_from_db()
+        self.assertEqual((self.kept.rating_count, self.kept.rating_sum, self.kept.rating_5), (0, 0, 0))
+        self.assertEqual(list(StoredBlob.objects.filter(name__in=self.blobs).values_list('refcount', flat=True)),
+                         [0] * len(self.blobs))
+        self.assertFalse(os.path.exists(self.part))
+        self.assertIsNone(deletion.process_next())
+
+    def test_failed_stage_is_retried_from_where_it_stopped(self):
+        deletion.request_deletion(self.user)
+        failing = [(name, mock.Mock(side_effect=OperationalError('database is locked')) if name == 'comments' else step)
+                   for name, step in deletion.STAGES]
+        with mock.patch.object(deletion, 'STAGES', failing):
+            job = self.process()
+        self.assertEqual((job.status, job.stage, job.attempts), (AccountDeletion.PENDING, 'ratings', 1))
+        self.assertIn('database is locked', job.last_error)
+        self.assertGreater(job.next_attempt_at, timezone.now() + timedelta(seconds=deletion.BACKOFF - 5))
+        self.assertIsNone(deletion.process_next())
+
+        AccountDeletion.objects.filter(pk=job.pk).update(next_attempt_at=timezone.now())
+        job = self.process()
+        self.assertEqual(job.status, AccountDeletion.DONE)
+        self.assertEqual(job.counts['ratings'], 1)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_gives_up_after_max_attempts(self):
+        job = deletion.request_deletion(self.user)
+        AccountDeletion.objects.filter(pk=job.pk).update(attempts=deletion.MAX_ATTEMPTS - 1)
+        failing = [(name, mock.Mock(side_effect=OperationalError('disk I/O error'))) for name, _ in deletion.STAGES]
+        with mock.patch.object(deletion, 'STAGES', failing):
+            job = self.process()
+        self.assertEqual(job.status, AccountDeletion.FAILED)
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
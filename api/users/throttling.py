@@ -0,0 +1,26 @@
+from api.throttling import AccountThrottle, IPThrottle
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login_ip'
+
+
+class LoginAccountThrottle(AccountThrottle):
+    scope = 'login_account'
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = 'register_ip'
+
+
+class VerificationIPThrottle(IPThrottle):
+    scope = 'verification_ip'
+
+
+class VerificationAccountThrottle(AccountThrottle):
+    scope = 'verification_account'
+
+
+LOGIN_THROTTLES = [LoginIPThrottle, LoginAccountThrottle]
+REGISTER_THROTTLES = [RegisterIPThrottle]
+VERIFICATION_THROTTLES = [VerificationIPThrottle, VerificationAccountThrottle]
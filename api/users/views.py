@@ -1,11 +1,10 @@
-import smtplib
-from email.mime.text import MIMEText
+import logging
 
-from django.conf import settings
+from django.db.models import Count, Max, Sum
 
 from rest_framework import status, exceptions, viewsets, mixins
 from rest_framework.decorators import api_view
-from rest_framework.decorators import action, permission_classes
+from rest_framework.decorators import action, permission_classes, throttle_classes
 from rest_framework.generics import get_object_or_404
 
 from rest_framework.permissions import IsAuthenticated, AllowAny
@@ -13,34 +12,27 @@ from rest_framework.request import Request
 from rest_framework.response import Response
 
 import rest_framework_simplejwt.exceptions
-from rest_framework_simplejwt.tokens import RefreshToken
 
 from api.books.models import Book
+from api.conditional import conditional_response, make_etag
 from api.books.serializers import BookViewSerializer
 from api.users import serializers
+from api.users.blacklist import RefreshToken
+from api.users.deletion import request_deletion
 from api.users.models import User
+from api.users.outbox import enqueue_email
 from api.users.serializers import UserSerializer, EmailSerializer, PasswordSerializer
+from api.users.throttling import REGISTER_THROTTLES, VERIFICATION_THROTTLES
 
+logger = logging.getLogger(__name__)
 
-def send_verification_email(email, message):
-    sender = settings.EMAIL_HOST_USER
-    subject = "Email Verification"
-
-    msg = MIMEText(message, _charset='utf-8')
-    msg['Subject'] = subject
-    msg['From'] = sender
-    msg['To'] = email
 
-    try:
-        with smtplib.SMTP_SSL(settings.EMAIL_HOST, settings.EMAIL_PORT) as smtp_server:
-            smtp_server.login(sender, settings.EMAIL_HOST_PASSWORD)
-            smtp_server.sendmail(sender, email, msg.as_string())
-        return "Message sent successfully!"
-    except smtplib.SMTPException as e:
-        raise e
+def send_verification_email(email, message):
+    return enqueue_email(email, "Email Verification", message)
 
 
 @api_view(['POST'])
+@throttle_classes(REGISTER_THROTTLES)
 def register(request: Request):
     try:
         serializer = UserSerializer(data=request.data)
@@ -55,8 +47,8 @@ def register(request: Request):
             }
             return Response(data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception('Registration failed')
         return Response("Internal Server Error", status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
@@ -65,21 +57,21 @@ def logout(request: Request):
     try:
         refresh = request.data.get('refresh')
         try:
-            print(refresh)
             token = RefreshToken(token=refresh)
 
         except rest_framework_simplejwt.exceptions.TokenError as e:
-            print(e)
+            logger.info('Rejected logout token: %s', e)
             return Response("Invalid token", status=status.HTTP_400_BAD_REQUEST)
         token.blacklist()
         return Response({"status": "Logged out"}, status=status.HTTP_200_OK)
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception('Logout failed')
         return Response("Internal Server Error", status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes(VERIFICATION_THROTTLES)
 def send_verification_url(request):
     try:
         serializer = EmailSerializer(data=request.data)
@@ -91,8 +83,8 @@ def send_verification_url(request):
         return Response(data={"detail": "Check email"}, status=status.HTTP_200_OK)
     except User.DoesNotExist:
         return Response("User with this email does not exists")
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception('Sending verification email failed')
         return Response("Internal Server Error", status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
@@ -117,8 +109,8 @@ def verify_email(request):
         return Response(status=status.HTTP_200_OK)
     except exceptions.NotFound as e:
         return Response(str(e), status=status.HTTP_404_NOT_FOUND)
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception('Email verification failed')
         return Response("Internal Server Error", status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
@@ -126,7 +118,6 @@ def verify_email(request):
 def reset_password(request):
     try:
         user_id = request.session.get('user')
-        print(user_id)
         if not user_id:
             raise exceptions.NotFound("No session found")
         user = User.objects.get(id=user_id)
@@ -139,8 +130,8 @@ def reset_password(request):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     except exceptions.NotFound as e:
         return Response(str(e), status=status.HTTP_404_NOT_FOUND)
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception('Password reset failed')
         return Response("Internal Server Error", status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
@@ -161,8 +152,8 @@ class UserViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=['delete'])
     def destroy(self, request):
-        request.user.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        request_deletion(request.user)
+        return Response({"detail": "Account scheduled for deletion"}, status=status.HTTP_202_ACCEPTED)
 
 
 class GetUserBooksView(mixins.ListModelMixin, viewsets.GenericViewSet):
@@ -170,13 +161,19 @@ class GetUserBooksView(mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = BookViewSerializer
 
     def list(self, request, *args, **kwargs):
-        user = get_object_or_404(User, email=kwargs['email'])
+        user = get_object_or_404(User, email=kwargs['email'], is_active=True)
         books = Book.objects.filter(user=user, is_private=False).all()
-        serializer = BookViewSerializer(books, many=True)
-        return Response(serializer.data)
+        state = books.aggregate(count=Count('id'), updated=Max('updated_at'), views=Sum('view_count'))
+        etag = make_etag(user.pk, state['count'], state['updated'], state['views'])
+        return conditional_response(request, lambda: Response(BookViewSerializer(books, many=True).data), etag=etag)
 
 
 class GetUserProfileView(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.filter(is_active=True)
     serializer_class = UserSerializer
     lookup_field = 'email'
+
+    def retrieve(self, request, *args, **kwargs):
+        user = self.get_object()
+        etag = make_etag(user.pk, user.name, user.email, user.is_superuser)
+        return conditional_response(request, lambda: Response(self.get_serializer(user).data), etag=etag)
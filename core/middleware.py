@@ -0,0 +1,120 @@
+import json
+import logging
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('core.slow_requests')
+
+DEFAULTS = {
+    'SERVER_TIMING': True,
+    'SLOW_REQUEST_MS': 500,
+    'SLOW_QUERY_COUNT': 50,
+    'SLOW_DUPLICATE_COUNT': 10,
+    'TOP_QUERIES': 5,
+}
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Collapse literals and IN-lists so queries differing only by values group together."""
+    sql = _LITERALS.sub('?', sql)
+    sql = _PLACEHOLDER_LISTS.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """`execute_wrapper` hook that times every statement of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.by_fingerprint = defaultdict(lambda: [0, 0.0])
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            self.statements[(sql, repr(params))] += 1
+            entry = self.by_fingerprint[fingerprint(sql)]
+            entry[0] += 1
+            entry[1] += elapsed
+
+    @property
+    def duplicates(self):
+        """Statements repeated with identical parameters, beyond their first run."""
+        return sum(count - 1 for count in self.statements.values())
+
+    def top(self, limit):
+        ranked = sorted(self.by_fingerprint.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {'sql': sql, 'count': count, 'ms': round(duration * 1000, 2)}
+            for sql, (count, duration) in ranked[:limit]
+        ]
+
+
+class QueryInstrumentationMiddleware:
+    """Count queries, DB time and duplicates per request.
+
+    The totals go out as a `Server-Timing` header; requests crossing any of
+    the REQUEST_INSTRUMENTATION thresholds are also written to the
+    `core.slow_requests` logger as one JSON record with the costliest SQL
+    fingerprints.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = {**DEFAULTS, **getattr(settings, 'REQUEST_INSTRUMENTATION', {})}
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        if self.config['SERVER_TIMING']:
+            response['Server-Timing'] = (
+                f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries", '
+                f'dup;desc="{recorder.duplicates} duplicate queries", '
+                f'total;dur={total * 1000:.2f}'
+            )
+        if self.is_slow(total, recorder):
+            self.log(request, response, total, recorder)
+        return response
+
+    def is_slow(self, total, recorder):
+        return (
+            total * 1000 >= self.config['SLOW_REQUEST_MS']
+            or recorder.count >= self.config['SLOW_QUERY_COUNT']
+            or recorder.duplicates >= self.config['SLOW_DUPLICATE_COUNT']
+        )
+
+    def log(self, request, response, total, recorder):
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'route': match.route if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(recorder.duration * 1000, 2),
+            'queries': recorder.count,
+            'duplicates': recorder.duplicates,
+            'top_queries': recorder.top(self.config['TOP_QUERIES']),
+        }
+        logger.warning(json.dumps(record), extra={'slow_request': record})
@@ -25,6 +25,7 @@ INSTALLED_APPS = [
     'api.books.apps.BooksConfig',
     'api.networks.apps.NetworksConfig',
     'api.chatapp.apps.ChatappConfig',
+    'api.benchmarks.apps.BenchmarksConfig',
     'rest_framework',
     'rest_framework_simplejwt.token_blacklist',
     'drf_yasg',
@@ -32,6 +33,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryInstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Ensure this is placed correctly
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -65,17 +67,34 @@ WSGI_APPLICATION = 'core.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / "db.sqlite3",
+        'NAME': os.getenv('DATABASE_NAME', BASE_DIR / "db.sqlite3"),
     }
 }
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'api.users.permissions.IsVerifiedUser',
-    )
+    ),
+    # Token buckets per scope, so a flood on one endpoint never drains another's budget.
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.getenv('THROTTLE_LOGIN_IP', '20/min'),
+        'login_account': os.getenv('THROTTLE_LOGIN_ACCOUNT', '5/min'),
+        'register_ip': os.getenv('THROTTLE_REGISTER_IP', '10/h'),
+        'verification_ip': os.getenv('THROTTLE_VERIFICATION_IP', '10/h'),
+        'verification_account': os.getenv('THROTTLE_VERIFICATION_ACCOUNT', '3/h'),
+    },
+    # Reverse proxies in front of the app whose X-Forwarded-For entries are trusted. 0 keys
+    # throttles on REMOTE_ADDR; None would trust the whole client-supplied header.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
+}
+
+# SQLiteStore shares counters between gunicorn workers; MemoryStore keeps them per process.
+THROTTLE_STORE = {
+    'BACKEND': os.getenv('THROTTLE_STORE_BACKEND', 'api.throttling.SQLiteStore'),
+    'PATH': os.getenv('THROTTLE_STORE_PATH', BASE_DIR / 'throttle.sqlite3'),
 }
 
 SWAGGER_SETTINGS = {
@@ -102,8 +121,135 @@ SIMPLE_JWT = {
     'ISSUER': None,
     'JWK_URL': None,
     'LEEWAY': 0,
+
+    'TOKEN_OBTAIN_SERIALIZER': 'api.users.serializers.VerifiedTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.users.serializers.FilteredTokenRefreshSerializer',
+}
+
+TOKEN_BLACKLIST_FILTER = {
+    # Blacklisting bumps a stamp in this alias; a shared alias makes other workers sync at once.
+    'ALIAS': 'default',
+    'CAPACITY': int(os.getenv('TOKEN_BLACKLIST_CAPACITY', 100000)),
+    'ERROR_RATE': 0.001,
+    'SYNC_INTERVAL': 5,
+    'REBUILD_INTERVAL': 3600,
+}
+
+AUTH_USER_CACHE = {
+    # Version stamps share the response version store, so a deactivation or
+    # password change made by any process reaches every worker at once.
+    'ALIAS': 'versions',
+    'MAX_SIZE': int(os.getenv('AUTH_USER_CACHE_SIZE', 10000)),
+    'TTL': int(os.getenv('AUTH_USER_CACHE_TTL', 300)),
+    'VERIFIED_CLAIM': True,
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Per-worker LRU by default; point it at FileBasedCache (or any shared
+    # backend) to share cached responses between gunicorn workers.
+    'responses': {
+        'BACKEND': os.getenv('RESPONSE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', 'responses'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 5000))},
+    },
+    # Response version stamps, shared by the gunicorn workers and the management
+    # commands so a write from any process invalidates every worker's entries.
+    # Only writes add stamps; keep MAX_ENTRIES above the number of books and
+    # comment threads ever written, since a culled stamp reads as version 0.
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('RESPONSE_VERSION_LOCATION', BASE_DIR / '.cache' / 'versions'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('RESPONSE_VERSION_MAX_ENTRIES', 100000))},
+    },
+}
+
+RESPONSE_CACHE = {
+    'ALIAS': 'responses',
+    'VERSION_ALIAS': 'versions',
+    # Catalogue pages and book details embed approximate view counts, which never bump versions.
+    'LIST_TIMEOUT': 30,
 }
 
+BOOK_VIEW_COUNTER = {
+    'FLUSH_EVERY': int(os.getenv('BOOK_VIEW_FLUSH_EVERY', 100)),
+    'FLUSH_INTERVAL': float(os.getenv('BOOK_VIEW_FLUSH_INTERVAL', 5)),
+}
+
+REQUEST_INSTRUMENTATION = {
+    'SERVER_TIMING': os.getenv('SERVER_TIMING', 'true').lower() == 'true',
+    'SLOW_REQUEST_MS': float(os.getenv('SLOW_REQUEST_MS', 500)),
+    'SLOW_QUERY_COUNT': int(os.getenv('SLOW_QUERY_COUNT', 50)),
+    'SLOW_DUPLICATE_COUNT': int(os.getenv('SLOW_DUPLICATE_COUNT', 10)),
+    'TOP_QUERIES': 5,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': os.getenv('API_LOG_LEVEL', 'INFO')},
+        'core': {'handlers': ['console'], 'level': os.getenv('API_LOG_LEVEL', 'INFO')},
+    },
+}
+
+BOOK_RANKING = {
+    # Every book starts as if it already had PRIOR_WEIGHT votes of PRIOR_MEAN.
+    'PRIOR_MEAN': float(os.getenv('BOOK_RANKING_PRIOR_MEAN', 3.0)),
+    'PRIOR_WEIGHT': int(os.getenv('BOOK_RANKING_PRIOR_WEIGHT', 10)),
+    'TRENDING_HALF_LIFE_HOURS': float(os.getenv('BOOK_TRENDING_HALF_LIFE_HOURS', 24)),
+}
+
+BOOK_SIMILARITY = {
+    'TOP_K': int(os.getenv('BOOK_SIMILARITY_TOP_K', 20)),
+    'MIN_CORATERS': int(os.getenv('BOOK_SIMILARITY_MIN_CORATERS', 2)),
+    'MAX_USER_RATINGS': int(os.getenv('BOOK_SIMILARITY_MAX_USER_RATINGS', 500)),
+    # Stale books drained per batch after rating writes commit.
+    'REFRESH_BATCH_SIZE': 100,
+}
+
+NETWORK_FEED = {
+    # Actors with more friends than this write one broadcast row read by fan-out-on-read.
+    'FANOUT_LIMIT': int(os.getenv('FEED_FANOUT_LIMIT', 1000)),
+    'MAX_ENTRIES': int(os.getenv('FEED_MAX_ENTRIES', 500)),
+    'TRIM_PROBABILITY': 0.05,
+    # Queued events are fanned out after commit and retried with backoff; see api.networks.feed.
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': int(os.getenv('FEED_MAX_ATTEMPTS', 8)),
+    'BACKOFF_BASE': 5,
+    'BACKOFF_MAX': 600,
+    'LEASE': 300,
+}
+
+NETWORK_GRAPH = {
+    # Each worker keeps its own friendship graph for suggestions; see api.networks.graph.
+    'SYNC_INTERVAL': 30,
+    'REBUILD_INTERVAL': int(os.getenv('FRIEND_GRAPH_REBUILD_INTERVAL', 600)),
+    'MAX_SCAN': 2000,
+    'MAX_SUGGESTIONS': 50,
+}
+
+BULK_RATING_MAX = int(os.getenv('BULK_RATING_MAX', 200))
+RELATIONSHIP_LOOKUP_MAX = int(os.getenv('RELATIONSHIP_LOOKUP_MAX', 300))
+
+BOOK_UPLOAD_DIR = BASE_DIR / 'uploads'
+BOOK_UPLOAD_MAX_SIZE = int(os.getenv('BOOK_UPLOAD_MAX_SIZE', 1024 * 1024 * 1024))
+BOOK_UPLOAD_MAX_CHUNK = int(os.getenv('BOOK_UPLOAD_MAX_CHUNK', 8 * 1024 * 1024))
+
+BACKGROUND_TASK_WORKERS = int(os.getenv('BACKGROUND_TASK_WORKERS', 2))
+# Run background tasks inline after commit; run_benchmarks turns this on for its runs.
+BACKGROUND_TASKS_EAGER = False
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': "channels.layers.InMemoryChannelLayer"
@@ -137,19 +283,52 @@ STATIC_URL = 'static/'
 STATIC_DIR = BASE_DIR / 'static'
 MEDIA_DIR = BASE_DIR / 'media'
 MEDIA_ROOT = MEDIA_DIR
+
+STORAGES = {
+    # Media is stored by content hash and reference counted; see api.books.storage.
+    'default': {'BACKEND': 'api.books.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
 MEDIA_URL = '/media/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# Hand media transfers to the front proxy instead of streaming them from Python, e.g.
+# MEDIA_OFFLOAD_HEADER=X-Accel-Redirect MEDIA_OFFLOAD_PREFIX=/protected-media/ for nginx
+# or MEDIA_OFFLOAD_HEADER=X-Sendfile for Apache/lighttpd.
+MEDIA_OFFLOAD = {
+    'HEADER': os.getenv('MEDIA_OFFLOAD_HEADER'),
+    'PREFIX': os.getenv('MEDIA_OFFLOAD_PREFIX', '/protected-media/'),
+} if os.getenv('MEDIA_OFFLOAD_HEADER') else None
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_HOST_USER = 'nonegivenalmau@gmail.com'
-EMAIL_HOST_PASSWORD = 'fiycgblqapjwlbtk'
-EMAIL_USE_TLS = True
-EMAIL_PORT = 465
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 465))
+# Port 465 is implicit TLS (SMTP_SSL); STARTTLS ports such as 587 want EMAIL_USE_TLS instead.
+EMAIL_USE_SSL = os.getenv('EMAIL_USE_SSL', str(EMAIL_PORT == 465)).lower() == 'true'
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'false').lower() == 'true'
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
+
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': int(os.getenv('EMAIL_MAX_ATTEMPTS', 6)),
+    'BACKOFF_BASE': 30,
+    'BACKOFF_MAX': 3600,
+    'LEASE': 300,
+}
+
+ACCOUNT_DELETION = {
+    'BATCH_SIZE': int(os.getenv('ACCOUNT_DELETION_BATCH_SIZE', 500)),
+    'BOOK_BATCH_SIZE': 20,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 60,
+    'LEASE': 300,
+}
 
 APPEND_SLASH = True
 
@@ -1,11 +1,11 @@
 from django.conf import settings
 from django.conf.urls.static import static
-from django.urls import path, include
-
-urlpatterns = [
-    path('api/', include('api.urls'))
-] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT) + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+from django.urls import path, include, re_path
 
+from api.books.views import serve_media
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+urlpatterns = [
+    path('api/', include('api.urls')),
+    # Media always goes through serve_media, which keeps book files behind BookDownloadView.
+    re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve_media),
+] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
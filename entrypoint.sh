@@ -2,9 +2,58 @@
 
 export DJANGO_SETTINGS_MODULE=core.settings
 
+# Usage: entrypoint.sh [all|web|email-worker|deletion-worker|feed-worker]
+# "all" (the default) runs the web server with every worker supervised in the
+# same container; the other roles run one process each, for deployments that
+# give every worker its own service and restart policy.
+ROLE=${1:-${PROCESS_ROLE:-all}}
+
+# Restart a background worker whenever it exits, so a crash cannot silently
+# stop the outbox, the deletion queue or the feed while gunicorn keeps serving.
+supervise() {
+    name=$1
+    shift
+    (
+        while true; do
+            "$@"
+            echo "$name exited with status $?, restarting in 5s" >&2
+            sleep 5
+        done
+    ) &
+}
+
+case "$ROLE" in
+    email-worker)
+        exec python manage.py send_queued_emails
+        ;;
+    deletion-worker)
+        exec python manage.py process_account_deletions
+        ;;
+    feed-worker)
+        exec python manage.py publish_feed_events
+        ;;
+    web|all)
+        ;;
+    *)
+        echo "Unknown role: $ROLE" >&2
+        exit 2
+        ;;
+esac
+
 python manage.py collectstatic --noinput
 
 echo 'Applying migrations...'
 python manage.py migrate
 
-gunicorn core.wsgi:application --bind 0.0.0.0:$PORT
\ No newline at end of file
+if [ "$ROLE" = all ]; then
+    echo 'Starting email worker...'
+    supervise 'Email worker' python manage.py send_queued_emails
+
+    echo 'Starting account deletion worker...'
+    supervise 'Account deletion worker' python manage.py process_account_deletions
+
+    echo 'Starting feed worker...'
+    supervise 'Feed worker' python manage.py publish_feed_events
+fi
+
+exec gunicorn core.wsgi:application --bind 0.0.0.0:$PORT